@@ -3,7 +3,6 @@
 
 import sys
 import time
-from signal import SIGINT
 
 import numpy as np
 import cv2
@@ -16,6 +15,7 @@ import ailia
 # import original modules
 sys.path.append('./util')
 from utils import get_base_parser, update_parser
+from ipc_utils import CommandClient
 # logger
 from logging import getLogger  # noqa: E402
 
@@ -170,6 +170,18 @@ def model_changed(event):
 # Area setting
 # ======================
 
+# polygon zones of the settings json, list of {"type": "include" or
+# "ignore", "points": [[x, y], ...] normalized by the frame size}
+zones = []
+textZonesDetail = None
+
+def apply_zones_to_ui():
+    global textZonesDetail
+    if textZonesDetail is None:
+        return
+    include = len([z for z in zones if z.get("type", "include") == "include"])
+    textZonesDetail.set(str(include) + " include, " + str(len(zones) - include) + " ignore")
+
 def get_video_path():
     global input_list, input_index
     if "Camera:" in input_list[input_index]:
@@ -203,7 +215,9 @@ def get_settings():
     if checkBoxCategorySittingBln.get():
         settings["category_sitting"] = True
     else:
-        settings["category_sitting"] 
+        settings["category_sitting"] = False
+
+    settings["zones"] = zones
 
     settings["savepath"] = args.savepath
     settings["csvpath"] = args.csvpath
@@ -233,6 +247,10 @@ def set_settings(settings):
     global checkBoxCategorySittingBln
     checkBoxCategorySittingBln.set(settings["category_sitting"])
 
+    global zones
+    zones = settings.get("zones", [])
+    apply_zones_to_ui()
+
     if "savepath" in settings:
         args.savepath = settings["savepath"]
     if "csvpath" in settings:
@@ -250,6 +268,7 @@ def menu_file_open_click():
         with open(file_name, 'r') as json_file:
             settings = json.load(json_file)
             set_settings(settings)
+        reconfigure()
 
 def menu_file_saveas_click():
     fTyp = [("Config files", "*.json")]
@@ -411,6 +430,8 @@ def ui():
     detectionThresholdTextEntry = tkinter.Entry(frame, width=20)
     detectionThresholdTextEntry.insert(tkinter.END,"0.4")
     detectionThresholdTextEntry.grid(row=2, column=3, sticky=tk.NW, rowspan=1)
+    detectionThresholdTextEntry.bind("<FocusOut>", lambda event: reconfigure())
+    detectionThresholdTextEntry.bind("<Return>", lambda event: reconfigure())
 
     textPoseThreshold= tk.StringVar(frame)
     textPoseThreshold.set("Pose Threshold")
@@ -421,6 +442,8 @@ def ui():
     poseThresholdTextEntry = tkinter.Entry(frame, width=20)
     poseThresholdTextEntry.insert(tkinter.END,"0.4")
     poseThresholdTextEntry.grid(row=4, column=3, sticky=tk.NW, rowspan=1)
+    poseThresholdTextEntry.bind("<FocusOut>", lambda event: reconfigure())
+    poseThresholdTextEntry.bind("<Return>", lambda event: reconfigure())
 
     textLabels = tk.StringVar(frame)
     textLabels.set("Detection Category")
@@ -430,15 +453,26 @@ def ui():
     global checkBoxCategoryFallenBln
     checkBoxCategoryFallenBln = tkinter.BooleanVar()
     checkBoxCategoryFallenBln.set(True)
-    checkBoxCategoryFallenAssign = tkinter.Checkbutton(frame, variable=checkBoxCategoryFallenBln, text='Fallen')
+    checkBoxCategoryFallenAssign = tkinter.Checkbutton(frame, variable=checkBoxCategoryFallenBln, text='Fallen', command=reconfigure)
     checkBoxCategoryFallenAssign.grid(row=6, column=3, sticky=tk.NW, rowspan=1)
 
     global checkBoxCategorySittingBln
     checkBoxCategorySittingBln = tkinter.BooleanVar()
     checkBoxCategorySittingBln.set(True)
-    checkBoxCategorySittingAssign = tkinter.Checkbutton(frame, variable=checkBoxCategorySittingBln, text='Sitting')
+    checkBoxCategorySittingAssign = tkinter.Checkbutton(frame, variable=checkBoxCategorySittingBln, text='Sitting', command=reconfigure)
     checkBoxCategorySittingAssign.grid(row=7, column=3, sticky=tk.NW, rowspan=1)
 
+    textZones = tk.StringVar(frame)
+    textZones.set("Zones (Load settings)")
+    labelZones = tk.Label(frame, textvariable=textZones)
+    labelZones.grid(row=8, column=3, sticky=tk.NW)
+
+    global textZonesDetail
+    textZonesDetail = tk.StringVar(frame)
+    labelZonesDetail = tk.Label(frame, textvariable=textZonesDetail)
+    labelZonesDetail.grid(row=9, column=3, sticky=tk.NW)
+    apply_zones_to_ui()
+
     root.mainloop()
 
 # ======================
@@ -450,20 +484,79 @@ def main():
     args.csvpath = ""
     args.imgpath = ""
     ui()
+    stop_worker()
 
-import subprocess
+import threading
 
-proc = None
+worker = None
+worker_ready = threading.Event()
+worker_on_ready = None
 
-def run():
-    global proc
+def wait_worker(client, ready):
+    # the server answers once it is up, the first start downloads the models
+    try:
+        client.send({"cmd": "status"})
+        ready.set()
+    except ConnectionError:
+        pass
 
-    if not (proc==None):
-        proc.kill()
-        proc=None
+def poll_worker(client):
+    # polled from the mainloop, the window stays responsive during the wait
+    global worker_on_ready
+    if client is not worker:
+        return
+    if worker_ready.is_set():
+        on_ready = worker_on_ready
+        worker_on_ready = None
+        if on_ready is not None:
+            on_ready()
+    elif not client.alive():
+        logger.error(f"inference server exited with code {client.proc.returncode}")
+    else:
+        root.after(100, poll_worker, client)
+
+def start_worker(on_ready):
+    # inference server keeping the models loaded between runs, on_ready is
+    # called from the mainloop once it answers
+    global worker, worker_ready, worker_on_ready
+    worker_on_ready = on_ready
+    if worker is not None and worker.alive():
+        if worker_ready.is_set():
+            poll_worker(worker)
+        return
+    cmd = [sys.executable, "pose_resnet.py", "--server"]
+    dir = "./pose_estimation/pose_resnet/"
+    worker = CommandClient(cmd, cwd=dir)
+    worker_ready = threading.Event()
+    threading.Thread(target=wait_worker, args=(worker, worker_ready), daemon=True).start()
+    root.after(100, poll_worker, worker)
+
+def stop_worker():
+    global worker
+    if worker is not None:
+        if not worker_ready.is_set():
+            # still starting, e.g. downloading the models
+            worker.proc.terminate()
+        worker.close()
+    worker = None
+
+def send_worker(command):
+    # send a command to the running server, None if it is not up
+    if worker is None or not worker.alive() or not worker_ready.is_set():
+        return None
+    try:
+        reply = worker.send(command)
+    except ConnectionError as e:
+        logger.error(e)
+        return None
+    if not reply["ok"]:
+        logger.error(reply["error"])
+    return reply
 
-    cmd = sys.executable
+def run():
+    start_worker(send_run)
 
+def send_run():
     args_dict = {}#vars(args)
     args_dict["video"] = get_video_path()
         
@@ -497,36 +590,31 @@ def run():
     if checkBoxCategorySittingBln.get():
         args_dict["category_sitting"] = True
 
-    options = []
-    for key in args_dict:
-        if key=="ftype":
-            continue
-        if args_dict[key] is not None:
-            if args_dict[key] is True:
-                options.append("--"+key)
-            elif args_dict[key] is False:
-                continue
-            else:
-                options.append("--"+key)
-                options.append(str(args_dict[key]))
-
-    cmd = [cmd, "pose_resnet.py"] + options
-    print(" ".join(cmd))
-
-    dir = "./pose_estimation/pose_resnet/"
+    if zones:
+        args_dict["zones"] = zones
 
-    proc = subprocess.Popen(cmd, cwd=dir)
-    try:
-        outs, errs = proc.communicate(timeout=1)
-    except subprocess.TimeoutExpired:
-        pass
+    print(args_dict)
+    send_worker({"cmd": "run", "args": args_dict})
 
 
 def stop():
-    global proc
-    if not (proc==None):
-        proc.send_signal(SIGINT)
-        proc=None
+    send_worker({"cmd": "stop"})
+
+def reconfigure():
+    # apply the options to the running video, called on the changes of the
+    # Options widgets and on Load settings (the zones)
+    settings = get_settings()
+    args_dict = {}
+    try:
+        args_dict["detection_threshold"] = float(settings["detection_threshold"])
+        args_dict["pose_threshold"] = float(settings["pose_threshold"])
+    except ValueError as e:
+        logger.error(e)
+        return
+    args_dict["category_fallen"] = settings["category_fallen"]
+    args_dict["category_sitting"] = settings["category_sitting"]
+    args_dict["zones"] = settings["zones"]
+    send_worker({"cmd": "reconfigure", "args": args_dict})
 
 if __name__ == '__main__':
     main()
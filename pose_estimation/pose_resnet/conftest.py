@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def pose_resnet(monkeypatch):
+    # pose_resnet.py parses the arguments and finds its files relative to
+    # its own directory at import
+    pytest.importorskip('ailia')
+    monkeypatch.chdir(HERE)
+    monkeypatch.syspath_prepend(HERE)
+    monkeypatch.setattr(sys, 'argv', ['pose_resnet.py', '--server'])
+    import pose_resnet
+    monkeypatch.setattr(pose_resnet, 'load_models', lambda: (None, None, None))
+    return pose_resnet
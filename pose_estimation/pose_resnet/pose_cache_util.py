@@ -0,0 +1,154 @@
+import numpy as np
+import cv2
+
+import ailia
+
+from pose_resnet_util import PoseResult, KEYPOINT_X, KEYPOINT_Y
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+
+# reuse the keypoints if the crop box IoU with the last estimation is
+# above REUSE_IOU and the mean absolute difference of the grayscale crop
+# thumbnails (0 - 255) is below REUSE_DIFF
+REUSE_IOU = 0.9
+REUSE_DIFF = 4.0
+# estimate again after this many reuses
+REFRESH_INTERVAL = 30
+THUMBNAIL_SIZE = 16
+
+
+def box_iou(box_a, box_b):
+    x1 = max(box_a[0], box_b[0])
+    y1 = max(box_a[1], box_b[1])
+    x2 = min(box_a[2], box_b[2])
+    y2 = min(box_a[3], box_b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    area_a = (box_a[2] - box_a[0]) * (box_a[3] - box_a[1])
+    area_b = (box_b[2] - box_b[0]) * (box_b[3] - box_b[1])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 0
+
+
+def get_thumbnail(img, box):
+    px1, py1, px2, py2 = box
+    crop = img[py1:py2, px1:px2]
+    if crop.size == 0:
+        return np.zeros((THUMBNAIL_SIZE, THUMBNAIL_SIZE), dtype=np.float32)
+    crop = cv2.resize(
+        crop, (THUMBNAIL_SIZE, THUMBNAIL_SIZE), interpolation=cv2.INTER_AREA
+    )
+    if crop.ndim == 3:
+        crop = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    return crop.astype(np.float32)
+
+
+class PoseCache:
+    """
+    Per track cache of the estimated keypoints, to skip the pose
+    estimation of persons standing still.
+
+    lookup() gives the persons of a frame that need the estimation, and
+    merge() completes their PoseResult with the reused keypoints (shifted
+    by the box movement) and updates the cache.
+
+    Parameters
+    ----------
+    iou_threshold: float
+    diff_threshold: float
+    refresh_interval: int
+    """
+
+    def __init__(self, iou_threshold=REUSE_IOU, diff_threshold=REUSE_DIFF,
+                 refresh_interval=REFRESH_INTERVAL):
+        self.iou_threshold = iou_threshold
+        self.diff_threshold = diff_threshold
+        self.refresh_interval = refresh_interval
+        # track id -> (box, thumbnail, keypoints, reuse count)
+        self.entries = {}
+        self.pending = None
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, img, track_ids, boxes):
+        """
+        Parameters
+        ----------
+        img: numpy array
+        track_ids: list of int
+            Track id of each person
+        boxes: list of (px1, py1, px2, py2)
+            Crop box of each person
+
+        Returns
+        -------
+        indices: list of int
+            Indices of the persons to estimate
+        """
+        h, w = img.shape[0], img.shape[1]
+        thumbnails = [get_thumbnail(img, box) for box in boxes]
+        reused = [None] * len(boxes)
+        indices = []
+        for i, (track_id, box) in enumerate(zip(track_ids, boxes)):
+            entry = self.entries.get(track_id)
+            if entry is not None:
+                last_box, last_thumbnail, keypoints, count = entry
+                if count < self.refresh_interval and \
+                   self.iou_threshold <= box_iou(last_box, box) and \
+                   np.abs(thumbnails[i] - last_thumbnail).mean() < self.diff_threshold:
+                    keypoints = keypoints.copy()
+                    keypoints[:, KEYPOINT_X] += (box[0] + box[2] - last_box[0] - last_box[2]) / (2 * w)
+                    keypoints[:, KEYPOINT_Y] += (box[1] + box[3] - last_box[1] - last_box[3]) / (2 * h)
+                    reused[i] = keypoints
+                    continue
+            indices.append(i)
+
+        self.hits = self.hits + len(boxes) - len(indices)
+        self.misses = self.misses + len(indices)
+        self.pending = (track_ids, boxes, thumbnails, reused)
+        return indices
+
+    def merge(self, result):
+        """
+        Parameters
+        ----------
+        result: PoseResult
+            Estimation of the persons of the indices of lookup()
+
+        Returns
+        -------
+        result: PoseResult
+            Keypoints of every person of lookup()
+        """
+        track_ids, boxes, thumbnails, reused = self.pending
+        self.pending = None
+        keypoints = np.zeros(
+            (len(boxes), ailia.POSE_KEYPOINT_CNT, 4), dtype=np.float32
+        )
+        entries = {}
+        computed = 0
+        for i, track_id in enumerate(track_ids):
+            if reused[i] is None:
+                keypoints[i] = result.keypoints[computed]
+                computed = computed + 1
+                entries[track_id] = (boxes[i], thumbnails[i], keypoints[i], 0)
+            else:
+                keypoints[i] = reused[i]
+                # compare with the last estimation, so that slow movements
+                # add up until the estimation runs again
+                last_box, last_thumbnail, last_keypoints, count = self.entries[track_id]
+                entries[track_id] = (last_box, last_thumbnail, last_keypoints, count + 1)
+        # the tracks not in the frame are dropped
+        self.entries = entries
+        return PoseResult(keypoints)
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0
+
+    def log_stats(self):
+        logger.info(
+            f'pose cache: {self.hits} reused, {self.misses} estimated, '
+            f'hit rate {self.hit_rate() * 100:.1f}%'
+        )
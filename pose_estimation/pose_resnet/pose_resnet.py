@@ -1,9 +1,15 @@
+import os
 import sys
 import time
+import queue
+import shutil
+import signal
+import tempfile
+import threading
+import multiprocessing
 
 import numpy as np
 import cv2
-import math
 
 import ailia
 
@@ -13,7 +19,21 @@ from utils import get_base_parser, update_parser, get_savepath  # noqa: E402
 from model_utils import check_and_download_models  # noqa: E402
 from detector_utils import load_image  # noqa: E402
 import webcamera_utils  # noqa: E402
-from pose_resnet_util import compute, keep_aspect  # noqa: E402
+from video_utils import FrameReader, OutputWriter, is_camera_input  # noqa: E402
+from video_utils import split_frame_range, concat_videos, concat_csv  # noqa: E402
+from pipeline_utils import PipelineStage  # noqa: E402
+from buffer_pool_utils import BufferPool  # noqa: E402
+from job_queue_utils import JobQueue, STALE_TIMEOUT  # noqa: E402
+from checkpoint_utils import Checkpoint, CHECKPOINT_INTERVAL  # noqa: E402
+from ipc_utils import CommandServer, detach_stdout  # noqa: E402
+from settings_utils import SettingsWatcher, parse_bool  # noqa: E402
+from tracker_utils import IouTracker  # noqa: E402
+from motion_utils import MotionGate, MAX_SKIP  # noqa: E402
+from zone_utils import ZoneSet, load_zones  # noqa: E402
+from pose_resnet_util import compute_crops, compute_crops_multi, get_input_aspect, PersonDetections, PoseInputBuffer, CATEGORY_PERSON  # noqa: E402
+from pose_resnet_util import KEYPOINT_X, KEYPOINT_Y, KEYPOINT_SCORE  # noqa: E402
+from pose_cache_util import PoseCache, REUSE_IOU, REUSE_DIFF, REFRESH_INTERVAL  # noqa: E402
+from safety_util import classify_safety, get_status_text, STATUS_SAFETY, STATUS_NAMES  # noqa: E402
 
 # logger
 from logging import getLogger   # noqa: E402
@@ -53,6 +73,25 @@ COCO_CATEGORY = [
 THRESHOLD = 0.4
 IOU = 0.45
 POSE_THRESHOLD = 0.4
+POSE_BATCH_SIZE = 1
+PREFETCH = 4
+FRAME_INTERVAL = 10
+OUTPUT_QUEUE = 16
+BUFFER_POOL = 32
+SCHEDULES = ['round_robin', 'deadline']
+WORKERS = 1
+JOB_POLL_INTERVAL = 5
+
+# arguments applied to the running video by the reconfigure command and
+# the --settings file
+RECONFIGURABLE_ARGS = {
+    'detection_threshold': float, 'pose_threshold': float,
+    'category_fallen': parse_bool, 'category_sitting': parse_bool, 'zones': list,
+}
+
+DETECTION_INTERVAL = 1
+
+CSV_HEADER = ['frame', 'time', 'person', 'track', 'status', 'angle', 'x1', 'y1', 'x2', 'y2']
 
 
 # ======================
@@ -61,6 +100,12 @@ POSE_THRESHOLD = 0.4
 parser = get_base_parser(
     'Simple Baseline for Pose Estimation', IMAGE_PATH, SAVE_IMAGE_PATH,
 )
+parser.add_argument(
+    '-v', '--video', nargs='+', metavar='VIDEO', default=None,
+    help=('The input video path or webcamera-id. If several are given, all '
+          'streams are processed in one process with shared models, and the '
+          'outputs get the stream index as suffix.')
+)
 parser.add_argument(
     '--reverse',
     action='store_true',
@@ -91,7 +136,224 @@ parser.add_argument(
     default=POSE_THRESHOLD, type=float,
     help='The pose threshold for yolo. (default: '+str(POSE_THRESHOLD)+')'
 )
-args = update_parser(parser)
+parser.add_argument(
+    '--pose_batch_size',
+    default=POSE_BATCH_SIZE, type=int,
+    help='The maximum number of persons given to a single pose inference. '
+         '1 runs the pose model once per person. (default: '+str(POSE_BATCH_SIZE)+')'
+)
+parser.add_argument(
+    '--prefetch',
+    default=PREFETCH, type=int,
+    help='The number of frames decoded ahead in a background thread. '
+         '0 decodes in the inference thread. (default: '+str(PREFETCH)+')'
+)
+parser.add_argument(
+    '--latest_frame',
+    action='store_true',
+    help='Process only the latest sampled frame and drop stale ones '
+         '(for live cameras).'
+)
+parser.add_argument(
+    '--frame_interval',
+    default=FRAME_INTERVAL, type=int,
+    help='Process every N-th frame of the video. Skipped frames are not '
+         'decoded. (default: '+str(FRAME_INTERVAL)+')'
+)
+parser.add_argument(
+    '--sample_fps',
+    default=0, type=float,
+    help='Process this many frames per second of media time '
+         '(wall-clock time for cameras) instead of --frame_interval.'
+)
+parser.add_argument(
+    '--headless',
+    action='store_true',
+    help='Run video mode without display window. The overlay is drawn only '
+         'for the video / snapshot outputs. Stop by SIGINT or end of stream.'
+)
+parser.add_argument(
+    '--pipeline',
+    action='store_true',
+    help='Run detection and pose estimation in their own worker threads, '
+         'so that the detection of the next frame overlaps the pose '
+         'estimation and rendering of the current one.'
+)
+parser.add_argument(
+    '--schedule',
+    default=SCHEDULES[0], choices=SCHEDULES,
+    help='Frame scheduling of several --video streams. round_robin serves '
+         'the streams in turn, deadline serves the least recently served '
+         'streams first.'
+)
+parser.add_argument(
+    '--stream_batch',
+    default=0, type=int,
+    help='The maximum number of stream frames processed together in '
+         'multi stream mode. Their person crops share the pose inference. '
+         '0 takes one frame of every ready stream.'
+)
+parser.add_argument(
+    '--workers',
+    default=WORKERS, type=int,
+    help='Split a video file into frame ranges processed by this many '
+         'worker processes, and merge their csv / video outputs. Each range '
+         'starts with a fresh state, so the track ids, the snapshots and the '
+         'motion / pose reuse near the range starts may differ from a single '
+         'process. 0 uses every cpu core. (default: '+str(WORKERS)+')'
+)
+parser.add_argument(
+    '--job_queue',
+    default=None, type=str,
+    help='Run as a worker of this job queue directory. Video files put in '
+         'the directory are claimed by one worker each, and the results '
+         '(<name>.csv, <name>_res<ext of --savepath> if --savepath is given, '
+         '<name>_img/ if --imgpath is given) are written to its done/ '
+         'directory. Several workers on several hosts can share it.'
+)
+parser.add_argument(
+    '--job_stale_timeout',
+    default=STALE_TIMEOUT, type=float,
+    help='Seconds without heartbeat after which the job of a dead worker is '
+         'given back to the queue. (default: '+str(STALE_TIMEOUT)+')'
+)
+parser.add_argument(
+    '--job_exit_when_empty',
+    action='store_true',
+    help='Exit the job queue worker when no job is pending instead of '
+         'waiting for new jobs.'
+)
+parser.add_argument(
+    '--checkpoint',
+    default=None, type=str,
+    help='Save the progress of video file mode to this json file '
+         'periodically and on SIGINT. The video output is written in '
+         'segments merged at the end of the video.'
+)
+parser.add_argument(
+    '--checkpoint_interval',
+    default=CHECKPOINT_INTERVAL, type=float,
+    help='Seconds between checkpoints. (default: '+str(CHECKPOINT_INTERVAL)+')'
+)
+parser.add_argument(
+    '--resume',
+    action='store_true',
+    help='Resume from the --checkpoint file and append to the existing '
+         'outputs.'
+)
+parser.add_argument(
+    '--server',
+    action='store_true',
+    help='Run as a persistent inference server with the models kept loaded '
+         'per env_id, controlled by run / stop / reconfigure / status / '
+         'shutdown json commands on stdin, one per line, with the replies '
+         'on stdout (see ipc_utils). The server shuts down at the end of '
+         'stdin.'
+)
+parser.add_argument(
+    '--settings',
+    default=None, type=str,
+    help='Settings json file of the GUI (Save settings). Its detection / '
+         'pose thresholds and categories are applied at start and reloaded '
+         'at the next frame whenever the file is modified.'
+)
+parser.add_argument(
+    '--track',
+    action='store_true',
+    help='Track the persons across frames by IoU, and output their track '
+         'id in the csv and the overlay.'
+)
+parser.add_argument(
+    '--detection_interval',
+    default=DETECTION_INTERVAL, type=int,
+    help='Run the detector every N-th processed frame, and move the tracked '
+         'boxes in between (implies --track). The pose estimation runs on '
+         'every frame. (default: '+str(DETECTION_INTERVAL)+')'
+)
+parser.add_argument(
+    '--pose_reuse',
+    action='store_true',
+    help='Reuse the keypoints of a tracked person standing still instead of '
+         'estimating the pose again (implies --track).'
+)
+parser.add_argument(
+    '--pose_reuse_iou',
+    default=REUSE_IOU, type=float,
+    help='Minimum IoU of the person box with the last estimation for '
+         '--pose_reuse. (default: '+str(REUSE_IOU)+')'
+)
+parser.add_argument(
+    '--pose_reuse_diff',
+    default=REUSE_DIFF, type=float,
+    help='Maximum mean absolute difference (0-255) of the low resolution '
+         'grayscale person crop for --pose_reuse. (default: '+str(REUSE_DIFF)+')'
+)
+parser.add_argument(
+    '--pose_refresh',
+    default=REFRESH_INTERVAL, type=int,
+    help='Estimate the pose again after this many reuses. '
+         '(default: '+str(REFRESH_INTERVAL)+')'
+)
+parser.add_argument(
+    '--motion_threshold',
+    nargs='+', default=[0], type=float,
+    help='Skip the detection and pose estimation of frames where less than '
+         'this fraction (0-1) of the downscaled grayscale frame changed '
+         'since the last processed frame, and carry its results forward. '
+         'One value per --video stream, the last one applies to the rest. '
+         '0 disables. (default: 0)'
+)
+parser.add_argument(
+    '--motion_max_skip',
+    nargs='+', default=[MAX_SKIP], type=int,
+    help='Process a frame after this many frames skipped by '
+         '--motion_threshold. One value per --video stream. '
+         '(default: '+str(MAX_SKIP)+')'
+)
+parser.add_argument(
+    '--zones',
+    default=None, type=str,
+    help='Json file of polygon zones (a settings json with "zones", or the '
+         'list). Persons outside the include zones or inside the ignore '
+         'zones are not estimated nor reported. The "zones" of --settings '
+         'are reloaded like the thresholds.'
+)
+parser.add_argument(
+    '--csvpath',
+    default=None, type=str,
+    help='Save the not safety events of video mode to this csv file.'
+)
+parser.add_argument(
+    '--imgpath',
+    default=None, type=str,
+    help='Save a snapshot to this directory when a not safety person appears '
+         'in video mode.'
+)
+parser.add_argument(
+    '--output_queue',
+    default=OUTPUT_QUEUE, type=int,
+    help='The queue depth of the background video / snapshot / csv writer. '
+         '0 writes in the inference thread. (default: '+str(OUTPUT_QUEUE)+')'
+)
+parser.add_argument(
+    '--output_drop',
+    action='store_true',
+    help='Drop video frames and snapshots when the output queue is full '
+         'instead of waiting for it.'
+)
+parser.add_argument(
+    '--buffer_pool',
+    default=BUFFER_POOL, type=int,
+    help='The number of free frame buffers kept per resolution for reuse by '
+         'the decoder in video mode. 0 allocates every frame. '
+         '(default: '+str(BUFFER_POOL)+')'
+)
+# the server and the job queue modes get their videos later, not from -i
+mode_args, _ = parser.parse_known_args()
+args = update_parser(
+    parser,
+    check_input_type=not mode_args.server and mode_args.job_queue is None
+)
 
 
 # ======================
@@ -105,14 +367,14 @@ def hsv_to_rgb(h, s, v):
 
 def line(input_img, person, point1, point2):
     threshold = args.pose_threshold
-    if person.points[point1].score > threshold and\
-       person.points[point2].score > threshold:
+    if person[point1, KEYPOINT_SCORE] > threshold and\
+       person[point2, KEYPOINT_SCORE] > threshold:
         color = hsv_to_rgb(255*point1/ailia.POSE_KEYPOINT_CNT, 255, 255)
 
-        x1 = int(input_img.shape[1] * person.points[point1].x)
-        y1 = int(input_img.shape[0] * person.points[point1].y)
-        x2 = int(input_img.shape[1] * person.points[point2].x)
-        y2 = int(input_img.shape[0] * person.points[point2].y)
+        x1 = int(input_img.shape[1] * person[point1, KEYPOINT_X])
+        y1 = int(input_img.shape[0] * person[point1, KEYPOINT_Y])
+        x2 = int(input_img.shape[1] * person[point2, KEYPOINT_X])
+        y2 = int(input_img.shape[0] * person[point2, KEYPOINT_Y])
         cv2.line(input_img, (x1, y1), (x2, y2), color, 5)
 
 
@@ -159,96 +421,170 @@ def display_result(input_img, person):
          ailia.POSE_KEYPOINT_KNEE_RIGHT)
 
 
-def pose_estimation(detector, pose, img):
-    pose_img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
+# (args.zones, ZoneSet) of the current zones
+zone_cache = (None, None)
+
+
+def get_zone_set():
+    global zone_cache
+    if not args.zones:
+        return None
+    source, zone_set = zone_cache
+    if source is not args.zones:
+        zones = load_zones(args.zones) if isinstance(args.zones, str) else args.zones
+        zone_set = ZoneSet(zones)
+        zone_cache = (args.zones, zone_set)
+    return zone_set
+
+
+def uncrop_objects(objects, crop, h, w):
+    """
+    Objects detected in crop (x1, y1, x2, y2) of a h x w frame, normalized
+    by the frame
+    """
+    x1, y1, x2, y2 = crop
+    crop_w = x2 - x1
+    crop_h = y2 - y1
+    return [
+        ailia.DetectorObject(
+            category=obj.category,
+            prob=obj.prob,
+            x=(x1 + obj.x * crop_w) / w,
+            y=(y1 + obj.y * crop_h) / h,
+            w=obj.w * crop_w / w,
+            h=obj.h * crop_h / h,
+        )
+        for obj in objects
+    ]
+
+
+def detect_objects(detector, img, zone_set=None):
+    """
+    Detect the objects of img in the active zones
+
+    Returns
+    -------
+    objects: list of ailia.DetectorObject
+    """
+    if zone_set is None:
+        detector.compute(img, args.detection_threshold, IOU)
+        return get_detector_objects(detector)
+
     h, w = img.shape[0], img.shape[1]
-    count = detector.get_object_count()
-    pose_detections = []
-    for idx in range(count):
-        obj = detector.get_object(idx)
-        top_left = (int(w*obj.x), int(h*obj.y))
-        bottom_right = (int(w*(obj.x+obj.w)), int(h*(obj.y+obj.h)))
-        CATEGORY_PERSON = 0
-        if obj.category != CATEGORY_PERSON:
-            pose_detections.append(None)
-            continue
-        px1, py1, px2, py2 = keep_aspect(
-            top_left, bottom_right, pose_img, pose
+    crop = zone_set.get_crop(h, w)
+    if crop is None:
+        detector.compute(img, args.detection_threshold, IOU)
+        objects = get_detector_objects(detector)
+    else:
+        # the include zones are small, detect in their bounding box only
+        x1, y1, x2, y2 = crop
+        detector.compute(
+            np.ascontiguousarray(img[y1:y2, x1:x2]), args.detection_threshold, IOU
         )
-        crop_img = pose_img[py1:py2, px1:px2, :]
-        offset_x = px1/img.shape[1]
-        offset_y = py1/img.shape[0]
-        scale_x = crop_img.shape[1]/img.shape[1]
-        scale_y = crop_img.shape[0]/img.shape[0]
-        detections = compute(
-            pose, crop_img, offset_x, offset_y, scale_x, scale_y
+        objects = uncrop_objects(get_detector_objects(detector), crop, h, w)
+    return zone_set.filter(objects, h, w)
+
+
+def get_detector_objects(detector):
+    """
+    :param detector: ailia.Detector, or list of ailia.DetectorObject
+    :return: list of ailia.DetectorObject
+    """
+    if hasattr(detector, 'get_object_count'):
+        return [detector.get_object(idx) for idx in range(detector.get_object_count())]
+    return detector
+
+
+def get_person_detections(detector, img, tracked=False):
+    """
+    :param detector: ailia.Detector, list of ailia.DetectorObject, or
+        PersonDetections
+    :param tracked: the objects are TrackedObject of a tracker
+    :return: PersonDetections
+    """
+    if isinstance(detector, PersonDetections):
+        return detector
+    return PersonDetections.from_objects(
+        get_detector_objects(detector), img.shape[0], img.shape[1], tracked
+    )
+
+
+def get_pose_boxes(detector, aspect, img):
+    # aspect: the pose input aspect, read once from the net (PoseInputBuffer)
+    detections = get_person_detections(detector, img)
+    return detections.get_crop_boxes(aspect)
+
+
+def pose_estimation(detector, pose, img, pose_buffer=None, pose_cache=None):
+    # the crops are read from img as is (BGR or BGRA)
+    pose_img = img
+    detections = get_person_detections(detector, pose_img)
+    aspect = pose_buffer.aspect if pose_buffer is not None else get_input_aspect(pose)
+    boxes = get_pose_boxes(detections, aspect, pose_img)
+    if pose_cache is None:
+        return compute_crops(
+            pose, pose_img, boxes, args.pose_batch_size, pose_buffer
         )
-        pose_detections.append(detections)
-    return pose_detections
+
+    # estimate only the persons not reused from the cache
+    indices = pose_cache.lookup(pose_img, detections.track_ids.tolist(), boxes)
+    pose_detections = compute_crops(
+        pose, pose_img, boxes[indices], args.pose_batch_size, pose_buffer
+    )
+    return pose_cache.merge(pose_detections)
 
 
-def is_safety(detections):
-    threshold = args.pose_threshold
-    theta = 0
-    status = ""
-
-    if args.category_sitting:
-        # 膝がヒップよりも上にある
-        if detections.points[ailia.POSE_KEYPOINT_HIP_LEFT].score > threshold and detections.points[ailia.POSE_KEYPOINT_KNEE_LEFT].score > threshold:
-            if detections.points[ailia.POSE_KEYPOINT_HIP_LEFT].y > detections.points[ailia.POSE_KEYPOINT_KNEE_LEFT].y:
-                return False, "(Hip > Knee)"
-        if detections.points[ailia.POSE_KEYPOINT_HIP_RIGHT].score > threshold and detections.points[ailia.POSE_KEYPOINT_HIP_RIGHT].score > threshold:
-            if detections.points[ailia.POSE_KEYPOINT_HIP_RIGHT].y > detections.points[ailia.POSE_KEYPOINT_KNEE_RIGHT].y:
-                return False, "(Hip > Knee)"
-
-    if args.category_fallen:
-        # 頭が横にある
-        if detections.points[ailia.POSE_KEYPOINT_NOSE].score > threshold and detections.points[ailia.POSE_KEYPOINT_BODY_CENTER].score:
-            theta = math.atan2(-(detections.points[ailia.POSE_KEYPOINT_NOSE].y - detections.points[ailia.POSE_KEYPOINT_BODY_CENTER].y),
-                                detections.points[ailia.POSE_KEYPOINT_NOSE].x - detections.points[ailia.POSE_KEYPOINT_BODY_CENTER].x)
-            theta = 180 * theta / math.pi
-            status = "(Head Body angle " + str(int(theta)) + ")"
-            if not (theta >= 30 and theta <= 180 - 30):
-                return False, status
-        #else:
-        #    if detections.points[ailia.POSE_KEYPOINT_NOSE].score > threshold and detections.points[ailia.POSE_KEYPOINT_SHOULDER_CENTER].score:
-        #        theta = math.atan2(-(detections.points[ailia.POSE_KEYPOINT_NOSE].y - detections.points[ailia.POSE_KEYPOINT_SHOULDER_CENTER].y),
-        #                            detections.points[ailia.POSE_KEYPOINT_NOSE].x - detections.points[ailia.POSE_KEYPOINT_SHOULDER_CENTER].x)
-        #        theta = 180 * theta / math.pi
-        #        status = "(Head Shoulder angle " + str(int(theta)) + ")"
-        #        if not (theta >= 30 and theta <= 180 - 30):
-        #            return False, status
-
-    return True, status
-
-
-def plot_results(detector, pose, img, category, pose_detections, logging=True):
+def get_safety(pose_detections):
+    return classify_safety(
+        pose_detections.keypoints, args.pose_threshold,
+        args.category_fallen, args.category_sitting
+    )
+
+
+def get_events(detector, img, pose_detections, safety, frame_cnt, timestamp):
+    """
+    csv rows of the not safety persons of a frame
+    """
+    detections = get_person_detections(detector, img)
+    safety_status, safety_theta = safety
+    rows = []
+    for person_idx in np.flatnonzero(safety_status != STATUS_SAFETY).tolist():
+        theta = safety_theta[person_idx]
+        rows.append([
+            frame_cnt, f'{timestamp:.3f}', person_idx,
+            '' if detections.track_ids is None else int(detections.track_ids[person_idx]),
+            STATUS_NAMES[safety_status[person_idx]],
+            '' if np.isnan(theta) else int(theta),
+        ] + detections.pixel_boxes[person_idx].tolist())
+    return rows
+
+
+def plot_results(detector, aspect, img, category, pose_detections, logging=True, safety=None):
     h, w = img.shape[0], img.shape[1]
-    count = detector.get_object_count()
+    persons = get_person_detections(detector, img)
+    count = len(persons)
     if logging:
         logger.info(f'object_count={count}')
 
-    for idx in range(count):
-        obj = detector.get_object(idx)
-        top_left = (int(w*obj.x), int(h*obj.y))
-        bottom_right = (int(w*(obj.x+obj.w)), int(h*(obj.y+obj.h)))
-        text_position = (int(w*obj.x)+4, int(h*(obj.y+obj.h)-8))
+    if safety is None:
+        safety = get_safety(pose_detections)
+    safety_status, safety_theta = safety
 
-        # update image
-        if not (obj.category == 0):
-            continue
-        
-        CATEGORY_PERSON = 0
-        if obj.category != CATEGORY_PERSON:
-            continue
+    pixel_boxes = persons.pixel_boxes.tolist()
+    crop_boxes = get_pose_boxes(persons, aspect, img).tolist()
+    for person_idx in range(count):
+        x1, y1, x2, y2 = pixel_boxes[person_idx]
+        top_left = (x1, y1)
+        bottom_right = (x2, y2)
+        text_position = (x1+4, y2-8)
 
         # pose detection
-        px1, py1, px2, py2 = keep_aspect(
-            top_left, bottom_right, img, pose
+        px1, py1, px2, py2 = crop_boxes[person_idx]
+        detections = pose_detections.keypoints[person_idx]
+        safety = safety_status[person_idx] == STATUS_SAFETY
+        status = get_status_text(
+            safety_status[person_idx], safety_theta[person_idx]
         )
-        detections = pose_detections[idx]
-
-        safety, status = is_safety(detections)
 
         color = (0, 255, 0, 255) # Safety
         if not safety:
@@ -265,6 +601,8 @@ def plot_results(detector, pose, img, category, pose_detections, logging=True):
         if not safety:
             text = "Not safety"
         text = text + status
+        if persons.track_ids is not None:
+            text = f'ID {persons.track_ids[person_idx]} ' + text
         cv2.putText(
             img,
             text,
@@ -283,18 +621,10 @@ def plot_results(detector, pose, img, category, pose_detections, logging=True):
 # ======================
 def recognize_from_image():
     # net initialize
-    detector = ailia.Detector(
-        MODEL_PATH,
-        WEIGHT_PATH,
-        len(COCO_CATEGORY),
-        format=ailia.NETWORK_IMAGE_FORMAT_BGR,
-        channel=ailia.NETWORK_IMAGE_CHANNEL_FIRST,
-        range=ailia.NETWORK_IMAGE_RANGE_U_INT8,
-        algorithm=ailia.DETECTOR_ALGORITHM_YOLOX,
-        env_id=args.env_id,
-    )
+    detector = create_detector(ailia.NETWORK_IMAGE_FORMAT_BGR)
 
     pose = ailia.Net(POSE_MODEL_PATH, POSE_WEIGHT_PATH, env_id=args.env_id)
+    pose_buffer = PoseInputBuffer(pose)
 
     # input image loop
     for image_path in args.input:
@@ -305,7 +635,13 @@ def recognize_from_image():
 
         # inference
         logger.info('Start inference...')
-        detector.compute(img, args.detection_threshold, IOU)
+        zone_set = get_zone_set()
+        if zone_set is None:
+            detector.compute(img, args.detection_threshold, IOU)
+            objects = detector
+        else:
+            objects = detect_objects(detector, img, zone_set)
+        objects = get_person_detections(objects, img)
 
         # pose estimation
         if args.benchmark:
@@ -313,93 +649,957 @@ def recognize_from_image():
             total_time = 0
             for i in range(args.benchmark_count):
                 start = int(round(time.time() * 1000))
-                pose_detections = pose_estimation(detector, pose, img)
+                pose_detections = pose_estimation(objects, pose, img, pose_buffer)
                 end = int(round(time.time() * 1000))
                 logger.info(f'\tailia processing detection time {end - start} ms')
                 if i != 0:
                     total_time = total_time + (end - start)
             logger.info(f'\taverage detection time {total_time / (args.benchmark_count-1)} ms')
         else:
-            pose_detections = pose_estimation(detector, pose, img)
+            pose_detections = pose_estimation(objects, pose, img, pose_buffer)
 
         # plot result
-        res_img = plot_results(detector, pose, img, COCO_CATEGORY, pose_detections)
+        res_img = plot_results(objects, pose_buffer.aspect, img, COCO_CATEGORY, pose_detections)
+        if zone_set is not None:
+            zone_set.draw(res_img)
         savepath = get_savepath(args.savepath, image_path)
         logger.info(f'saved at : {savepath}')
         cv2.imwrite(savepath, res_img)
     logger.info('Script finished successfully.')
 
 
-def recognize_from_video():
-    # net initialize
-    detector = ailia.Detector(
+def create_detector(format):
+    return ailia.Detector(
         MODEL_PATH,
         WEIGHT_PATH,
         len(COCO_CATEGORY),
-        format=ailia.NETWORK_IMAGE_FORMAT_RGB,
+        format=format,
         channel=ailia.NETWORK_IMAGE_CHANNEL_FIRST,
         range=ailia.NETWORK_IMAGE_RANGE_U_INT8,
         algorithm=ailia.DETECTOR_ALGORITHM_YOLOX,
         env_id=args.env_id,
     )
 
-    pose = ailia.Net(POSE_MODEL_PATH, POSE_WEIGHT_PATH, env_id=args.env_id)
 
-    capture = webcamera_utils.get_capture(args.video)
+def create_tracker():
+    if args.track or args.detection_interval > 1 or args.pose_reuse:
+        return IouTracker()
+    return None
+
+
+def get_stream_value(values, stream_idx):
+    return values[min(stream_idx, len(values) - 1)]
+
+
+def create_motion_gate(stream_idx=0):
+    threshold = get_stream_value(args.motion_threshold, stream_idx)
+    if threshold <= 0:
+        return None
+    return MotionGate(threshold, get_stream_value(args.motion_max_skip, stream_idx))
+
+
+def create_pose_cache():
+    if args.pose_reuse:
+        return PoseCache(args.pose_reuse_iou, args.pose_reuse_diff, args.pose_refresh)
+    return None
+
+
+def detect_frame(detector, item, tracker=None, motion_gate=None):
+    frame_cnt, timestamp, frame = item
+    if motion_gate is not None and not motion_gate.check(frame):
+        # static frame, see carry_result()
+        return frame_cnt, timestamp, frame, None, None
+
+    # the detector and the pose crops read the BGR frame itself
+    img = frame
+    zone_set = get_zone_set()
+    if tracker is not None and not tracker.needs_detection(args.detection_interval):
+        # tracked boxes only
+        detections = tracker.predict()
+        if zone_set is not None:
+            detections = zone_set.filter(detections, img.shape[0], img.shape[1])
+    else:
+        detections = detect_objects(detector, img, zone_set)
+        if tracker is not None:
+            detections = tracker.update([
+                obj for obj in detections if obj.category == CATEGORY_PERSON
+            ])
+    # the person boxes of the frame, used by the next stages
+    return frame_cnt, timestamp, frame, img, get_person_detections(
+        detections, img, tracker is not None
+    )
+
+
+def carry_result(result, item):
+    """
+    Result of a static frame, the one of the last processed frame
+    """
+    frame_cnt, timestamp, frame = item[:3]
+    return (frame_cnt, timestamp, frame) + result[3:]
+
+
+def estimate_frame(pose, pose_buffer, item, pose_cache=None):
+    frame_cnt, timestamp, frame, img, detections = item
+    pose_detections = pose_estimation(detections, pose, img, pose_buffer, pose_cache)
+    safety = get_safety(pose_detections)
+    return frame_cnt, timestamp, frame, detections, pose_detections, safety
+
+
+def reconfigure(overrides):
+    """
+    Apply reconfigurable arguments, used from the next frame. Nothing is
+    applied if a value is invalid.
+
+    Raises
+    ------
+    ValueError
+        A value can not be converted
+    """
+    values = {
+        key: RECONFIGURABLE_ARGS[key](value) for key, value in overrides.items()
+    }
+    for key, value in values.items():
+        setattr(args, key, value)
+    logger.info(f'reconfigured: {overrides}')
+
+
+def apply_settings(settings_watcher):
+    if settings_watcher is None:
+        return
+    settings = settings_watcher.poll()
+    if settings is not None:
+        try:
+            reconfigure({
+                key: value for key, value in settings.items()
+                if key in RECONFIGURABLE_ARGS
+            })
+        except (TypeError, ValueError) as e:
+            logger.error(f'{settings_watcher.path}: {e}')
+
+
+def create_settings_watcher():
+    return SettingsWatcher(args.settings) if args.settings else None
+
+
+def get_stream_path(path, stream_idx):
+    """
+    Output path of the stream_idx-th stream in multi stream mode
+    """
+    base, ext = os.path.splitext(path)
+    return f'{base}_{stream_idx}{ext}'
+
+
+# BufferPool of the decoded frames, released by write_results()
+buffer_pool = None
+
+
+def get_buffer_pool():
+    global buffer_pool
+    if buffer_pool is None and args.buffer_pool > 0:
+        buffer_pool = BufferPool(args.buffer_pool)
+    return buffer_pool
+
+
+def create_reader(video, start_frame=0):
+    capture = webcamera_utils.get_capture(video)
+    reader = FrameReader(
+        capture, args.prefetch, args.latest_frame, is_camera_input(video),
+        frame_interval=args.frame_interval,
+        sample_interval=1 / args.sample_fps if args.sample_fps > 0 else 0,
+        start_frame=start_frame, pool=get_buffer_pool(),
+    )
+    return capture, reader
+
+
+def create_writer(capture, savepath):
+    f_h = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    f_w = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+    return webcamera_utils.get_writer(savepath, f_h, f_w)
+
+
+def create_output(capture, savepath, csvpath, imgpath, csv_offset=None):
     # create video writer if savepath is specified as video format
-    if args.savepath != SAVE_IMAGE_PATH:
-        f_h = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        f_w = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
-        writer = webcamera_utils.get_writer(args.savepath, f_h, f_w)
+    if savepath is not None:
+        writer = create_writer(capture, savepath)
     else:
         writer = None
-    
+    if imgpath:
+        os.makedirs(imgpath, exist_ok=True)
+
+    # encode and write in background thread
+    return OutputWriter(
+        writer, csvpath, CSV_HEADER, args.output_queue, args.output_drop,
+        csv_offset, get_buffer_pool()
+    )
+
+
+def write_results(output, aspect, result, prev_events, imgpath, window=None):
+    """
+    Write the csv events, the overlay and the snapshot of a processed frame.
+    The frame goes back to the buffer pool once written.
+
+    Returns
+    -------
+    events: int
+        the number of not safety persons in the frame
+    """
+    frame_cnt, timestamp, frame, detections, pose_detections, safety = result
+    events = get_events(detections, frame, pose_detections, safety, frame_cnt, timestamp)
+    snapshot = imgpath and len(events) > prev_events
+    output.write_rows(events)
+
+    # draw only if someone looks at it
+    if window is None and output.writer is None and not snapshot:
+        output.release(frame)
+        return len(events)
+    res_img = plot_results(detections, aspect, frame, COCO_CATEGORY, pose_detections, False, safety)
+    zone_set = get_zone_set()
+    if zone_set is not None:
+        zone_set.draw(res_img)
+    if window is not None:
+        cv2.imshow(window, res_img)
+    # save results
+    output.write(res_img)
+    if snapshot:
+        savepath = os.path.join(imgpath, f'frame_{frame_cnt:08d}.png')
+        output.write_image(savepath, res_img)
+    output.release(frame)
+    return len(events)
+
+
+def create_sharded_reader(video, start_frame, end_frame):
+    capture = webcamera_utils.get_capture(video)
+    reader = FrameReader(
+        capture, args.prefetch, False, False,
+        frame_interval=args.frame_interval,
+        sample_interval=1 / args.sample_fps if args.sample_fps > 0 else 0,
+        start_frame=start_frame, end_frame=end_frame, pool=get_buffer_pool(),
+    )
+    return capture, reader
+
+
+def run_video(detector, pose, pose_buffer, reader, output, imgpath, stop_event, headless,
+              prev_events=0, on_result=None, tracker=None):
+    """
+    Process every frame of reader until the end of stream or stop_event
+
+    on_result(frame_cnt, prev_events, tracker_state) is called after each
+    written frame, with the tracker state right after the detection of that
+    frame (None without tracker).
+    Returns True at the end of stream, False when stopped.
+    """
+    def read_frame():
+        ret, frame_cnt, timestamp, frame = reader.read()
+        if not ret or stop_event.is_set():
+            return None
+        if args.reverse:
+            # in place, the decoded frame is not shared
+            cv2.flip(frame, 0, dst=frame)
+        return frame_cnt, timestamp, frame
+
+    pose_cache = create_pose_cache()
+    motion_gate = create_motion_gate()
+    last_result = None
+
+    # the tracker state of each detected frame for on_result(), with
+    # --pipeline the detection stage runs ahead of the written frames
+    tracker_states = {} if on_result is not None and tracker is not None else None
+
+    def detect(item):
+        item = detect_frame(detector, item, tracker, motion_gate)
+        if tracker_states is not None:
+            tracker_states[item[0]] = tracker.get_state()
+        return item
+
+    def estimate(item):
+        nonlocal last_result
+        if item[4] is None:
+            return carry_result(last_result, item)
+        last_result = estimate_frame(pose, pose_buffer, item, pose_cache)
+        return last_result
+
+    stages = []
+    if args.pipeline:
+        # the detection stage and the pose stage run in their own thread
+        # and own their own model
+        stages.append(PipelineStage('detection', detect, read_frame).start())
+        stages.append(PipelineStage('pose', estimate, stages[-1].get).start())
+        next_result = stages[-1].get
+    else:
+        def next_result():
+            item = read_frame()
+            if item is None:
+                return None
+            return estimate(detect(item))
+
+    window = None if headless else 'frame'
     frame_shown = False
-    frame_cnt = 0
+    completed = False
+    settings_watcher = create_settings_watcher()
     while(True):
-        ret, frame = capture.read()
-        if args.reverse:
-            frame = frame[::-1,:,:].copy()
-        if frame_cnt % 10 != 0:
-            frame_cnt = frame_cnt + 1
-            continue
-        frame_cnt = frame_cnt + 1
-        if (cv2.waitKey(1) & 0xFF == ord('q')) or not ret:
-            break
-        if frame_shown and cv2.getWindowProperty('frame', cv2.WND_PROP_VISIBLE) == 0:
+        apply_settings(settings_watcher)
+        result = next_result()
+        if result is None or stop_event.is_set():
+            completed = not stop_event.is_set()
             break
+        if not headless:
+            if (cv2.waitKey(1) & 0xFF == ord('q')):
+                break
+            if frame_shown and cv2.getWindowProperty('frame', cv2.WND_PROP_VISIBLE) == 0:
+                break
 
-        img = cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA)
-        detector.compute(img, args.detection_threshold, IOU)
-        pose_detections = pose_estimation(detector, pose, img)
-        res_img = plot_results(detector, pose, frame, COCO_CATEGORY, pose_detections, False)
-        cv2.imshow('frame', res_img)
-        frame_shown = True
-        # save results
-        if writer is not None:
-            writer.write(res_img)
+        prev_events = write_results(
+            output, pose_buffer.aspect, result, prev_events, imgpath, window
+        )
+        frame_shown = window is not None
+        if on_result is not None:
+            tracker_state = None
+            if tracker_states is not None:
+                tracker_state = tracker_states.pop(result[0], None)
+            on_result(result[0], prev_events, tracker_state)
+
+    for stage in stages:
+        stage.stop()
+        stage.log_stats()
+    if pose_cache is not None:
+        pose_cache.log_stats()
+    if motion_gate is not None:
+        motion_gate.log_stats()
+    return completed
+
+
+def get_segment_path(savepath, segment_idx):
+    base, ext = os.path.splitext(savepath)
+    return f'{base}.part{segment_idx:04d}{ext}'
+
+
+def load_checkpoint(video):
+    """
+    Returns
+    -------
+    checkpoint: Checkpoint
+        None if --checkpoint is not given
+    state: dict
+        progress to resume from (see recognize_from_video())
+    """
+    state = {
+        'video': video, 'next_frame': 0, 'prev_events': 0,
+        'csv_offset': None, 'segments': [], 'state': {},
+    }
+    if args.checkpoint is None:
+        return None, state
+    if is_camera_input(video):
+        logger.warning('--checkpoint is ignored for camera input')
+        return None, state
+
+    checkpoint = Checkpoint(args.checkpoint, args.checkpoint_interval)
+    if args.resume:
+        saved = checkpoint.load()
+        if saved is None:
+            logger.info(f'no checkpoint {args.checkpoint}, start from the first frame')
+        elif saved['video'] != video:
+            logger.warning(f'checkpoint {args.checkpoint} is for {saved["video"]}, ignored')
+        else:
+            logger.info(f'resume from frame {saved["next_frame"]}')
+            state = saved
+    return checkpoint, state
+
+
+def load_models():
+    detector = create_detector(ailia.NETWORK_IMAGE_FORMAT_RGB)
+    pose = ailia.Net(POSE_MODEL_PATH, POSE_WEIGHT_PATH, env_id=args.env_id)
+    return detector, pose, PoseInputBuffer(pose)
+
+
+def recognize_from_video(models=None, stop_event=None):
+    # net initialize
+    if models is None:
+        models = load_models()
+    detector, pose, pose_buffer = models
+
+    video = args.video[0]
+    checkpoint, state = load_checkpoint(video)
+    capture, reader = create_reader(video, state['next_frame'])
+    savepath = args.savepath if args.savepath != SAVE_IMAGE_PATH else None
+    if checkpoint is not None and savepath is not None:
+        # video files can not be appended, write a segment per checkpoint
+        segment_path = get_segment_path(savepath, len(state['segments']))
+    else:
+        segment_path = savepath
+    csv_offset = state['csv_offset'] if args.csvpath else None
+    output = create_output(
+        capture, segment_path, args.csvpath, args.imgpath, csv_offset
+    ).start()
+
+    # decode in background thread
+    reader.start()
+
+    # stop by SIGINT (Stop button of the GUI)
+    if stop_event is None:
+        stop_event = threading.Event()
+        signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+
+    tracker = create_tracker()
+    if tracker is not None and 'tracker' in state['state']:
+        tracker.set_state(state['state']['tracker'])
 
+    def on_result(frame_cnt, prev_events, tracker_state):
+        if args.sample_fps > 0:
+            state['next_frame'] = frame_cnt + 1
+        else:
+            state['next_frame'] = frame_cnt + args.frame_interval
+        state['prev_events'] = prev_events
+        if tracker_state is not None:
+            # the state of next_frame, not of the frames detected ahead
+            state['state']['tracker'] = tracker_state
+        if not checkpoint.due():
+            return
+        if savepath is not None:
+            state['segments'].append(get_segment_path(savepath, len(state['segments'])))
+            output.replace_writer(create_writer(
+                capture, get_segment_path(savepath, len(state['segments']))
+            ))
+        state['csv_offset'] = output.csv_tell()
+        checkpoint.save(state)
+
+    completed = run_video(
+        detector, pose, pose_buffer, reader, output, args.imgpath,
+        stop_event, args.headless, state['prev_events'],
+        on_result if checkpoint is not None else None, tracker
+    )
+
+    reader.stop()
+    if not args.headless:
+        cv2.destroyAllWindows()
+    if checkpoint is None:
+        capture.release()
+        output.close()
+        logger.info('Script finished successfully.')
+        return
+
+    state['csv_offset'] = output.csv_tell()
+    output.close()
+    if savepath is not None:
+        state['segments'].append(get_segment_path(savepath, len(state['segments'])))
+    if completed:
+        if savepath is not None:
+            writer = create_writer(capture, savepath)
+            count = concat_videos(state['segments'], writer)
+            writer.release()
+            logger.info(f'merged {count} frames to {savepath}')
+            for path in state['segments']:
+                if os.path.exists(path):
+                    os.remove(path)
+        checkpoint.remove()
+    else:
+        checkpoint.save(state)
+        logger.info(f'checkpoint saved to {args.checkpoint}, continue with --resume')
     capture.release()
-    cv2.destroyAllWindows()
-    if writer is not None:
-        writer.release()
     logger.info('Script finished successfully.')
 
 
+# models of a shard worker process, loaded by the first shard
+shard_models = None
+
+
+def init_shard_worker():
+    # the parent process handles SIGINT and terminates the pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def process_shard(shard):
+    """
+    Process the frame range of one shard in a worker process
+    """
+    global shard_models
+    shard_idx, video, start_frame, end_frame, savepath, csvpath = shard
+    if shard_models is None:
+        detector = create_detector(ailia.NETWORK_IMAGE_FORMAT_RGB)
+        pose = ailia.Net(POSE_MODEL_PATH, POSE_WEIGHT_PATH, env_id=args.env_id)
+        shard_models = (detector, pose, PoseInputBuffer(pose))
+    detector, pose, pose_buffer = shard_models
+
+    logger.info(f'shard {shard_idx}: frames {start_frame} - {end_frame}')
+    capture, reader = create_sharded_reader(video, start_frame, end_frame)
+    output = create_output(capture, savepath, csvpath, args.imgpath).start()
+    reader.start()
+    run_video(
+        detector, pose, pose_buffer, reader, output, args.imgpath,
+        threading.Event(), True, tracker=create_tracker()
+    )
+    reader.stop()
+    capture.release()
+    output.close()
+    if buffer_pool is not None:
+        buffer_pool.log_stats(f'shard {shard_idx} buffer pool')
+    return shard_idx
+
+
+def recognize_from_video_shards():
+    """
+    Process a video file in frame range shards. The sampled frames are the
+    same as a single pass, but each shard starts with a fresh state: the
+    tracker (track ids restart in every shard), the pose cache, the motion
+    gate and the not safety count deciding the snapshots. So the csv rows
+    and snapshots near the shard starts may differ from a single pass.
+    """
+    video = args.video[0]
+    capture = webcamera_utils.get_capture(video)
+    frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    f_h = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    f_w = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+    capture.release()
+
+    workers = args.workers if args.workers > 0 else os.cpu_count()
+    shards = split_frame_range(frame_count, workers, args.frame_interval)
+    logger.info(f'{frame_count} frames split into {len(shards)} shards')
+
+    # per shard outputs, merged in frame order at the end
+    savepath = args.savepath if args.savepath != SAVE_IMAGE_PATH else None
+    shard_dir = tempfile.mkdtemp(prefix='pose_resnet_shards_')
+    tasks = []
+    for shard_idx, (start_frame, end_frame) in enumerate(shards):
+        shard_savepath = None
+        if savepath is not None:
+            ext = os.path.splitext(savepath)[1]
+            shard_savepath = os.path.join(shard_dir, f'shard_{shard_idx}{ext}')
+        shard_csvpath = None
+        if args.csvpath:
+            shard_csvpath = os.path.join(shard_dir, f'shard_{shard_idx}.csv')
+        tasks.append((
+            shard_idx, video, start_frame, end_frame,
+            shard_savepath, shard_csvpath
+        ))
+
+    # stop by SIGINT (Stop button of the GUI)
+    stop_event = threading.Event()
+    with multiprocessing.Pool(len(tasks), initializer=init_shard_worker) as pool:
+        signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+        result = pool.map_async(process_shard, tasks, chunksize=1)
+        while not result.ready():
+            if stop_event.is_set():
+                pool.terminate()
+                break
+            result.wait(0.5)
+        if not stop_event.is_set():
+            # raise the exception of a failed shard
+            result.get()
+
+    if stop_event.is_set():
+        logger.info('stopped, shard outputs are discarded')
+    else:
+        if savepath is not None:
+            writer = webcamera_utils.get_writer(savepath, f_h, f_w)
+            count = concat_videos([task[4] for task in tasks], writer)
+            writer.release()
+            logger.info(f'merged {count} frames to {savepath}')
+        if args.csvpath:
+            concat_csv([task[5] for task in tasks], args.csvpath)
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    logger.info('Script finished successfully.')
+
+
+def get_job_outputs(job):
+    """
+    Returns
+    -------
+    savepath: str
+        None without a video output
+    csvpath: str
+    imgpath: str
+        None without --imgpath
+    """
+    savepath = None
+    if args.savepath != SAVE_IMAGE_PATH:
+        savepath = job.output_path('_res' + os.path.splitext(args.savepath)[1])
+    imgpath = job.output_path('_img') if args.imgpath else None
+    return savepath, job.output_path('.csv'), imgpath
+
+
+def remove_job_outputs(job):
+    # the partial outputs of a failed or released job
+    savepath, csvpath, imgpath = get_job_outputs(job)
+    for path in (savepath, csvpath):
+        if path is not None and os.path.exists(path):
+            os.remove(path)
+    if imgpath is not None:
+        shutil.rmtree(imgpath, ignore_errors=True)
+
+
+def process_job(detector, pose, pose_buffer, job, stop_event):
+    """
+    Raises
+    ------
+    IOError
+        The video can not be opened or has no frame
+    """
+    savepath, csvpath, imgpath = get_job_outputs(job)
+
+    capture, reader = create_reader(job.path)
+    if not capture.isOpened():
+        capture.release()
+        raise IOError(f'can not open {job.path}')
+    output = create_output(capture, savepath, csvpath, imgpath).start()
+    reader.start()
+    try:
+        completed = run_video(
+            detector, pose, pose_buffer, reader, output, imgpath, stop_event, True,
+            tracker=create_tracker()
+        )
+    finally:
+        reader.stop()
+        capture.release()
+        output.close()
+    if completed and reader.decoded == 0:
+        raise IOError(f'no frame decoded from {job.path}')
+
+
+def recognize_from_job_queue():
+    # net initialize (kept loaded between jobs)
+    detector = create_detector(ailia.NETWORK_IMAGE_FORMAT_RGB)
+
+    pose = ailia.Net(POSE_MODEL_PATH, POSE_WEIGHT_PATH, env_id=args.env_id)
+    pose_buffer = PoseInputBuffer(pose)
+
+    job_queue = JobQueue(args.job_queue, args.job_stale_timeout)
+    logger.info(f'job queue worker {job_queue.worker_id} on {args.job_queue}')
+
+    # stop by SIGINT, the current job is given back to the queue
+    stop_event = threading.Event()
+    signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+
+    job_count = 0
+    while not stop_event.is_set():
+        job_queue.recover_stale()
+        job = job_queue.claim()
+        if job is None:
+            if args.job_exit_when_empty:
+                break
+            stop_event.wait(JOB_POLL_INTERVAL)
+            continue
+
+        try:
+            process_job(detector, pose, pose_buffer, job, stop_event)
+        except Exception:
+            logger.exception(f'job {job.name} failed')
+            remove_job_outputs(job)
+            job.fail()
+            continue
+        if stop_event.is_set():
+            remove_job_outputs(job)
+            job.release()
+        else:
+            job.complete()
+            job_count = job_count + 1
+
+    logger.info(f'{job_count} jobs processed')
+    logger.info('Script finished successfully.')
+
+
+class Stream:
+    """
+    State of one input of the multi stream mode
+    """
+
+    def __init__(self, idx, video):
+        self.idx = idx
+        self.video = video
+        self.capture, self.reader = create_reader(video)
+        savepath = None
+        if args.savepath != SAVE_IMAGE_PATH:
+            savepath = get_stream_path(args.savepath, idx)
+        csvpath = get_stream_path(args.csvpath, idx) if args.csvpath else None
+        self.imgpath = os.path.join(args.imgpath, f'stream_{idx}') if args.imgpath else None
+        self.output = create_output(self.capture, savepath, csvpath, self.imgpath)
+        self.window = None if args.headless else f'frame_{idx}'
+        self.tracker = create_tracker()
+        self.pose_cache = create_pose_cache()
+        self.motion_gate = create_motion_gate(idx)
+        self.last_result = None
+        self.prev_events = 0
+        self.last_served = 0
+        self.done = False
+
+    def start(self):
+        self.reader.start()
+        self.output.start()
+        return self
+
+    def close(self):
+        self.reader.stop()
+        self.capture.release()
+        self.output.close()
+        if self.pose_cache is not None:
+            self.pose_cache.log_stats()
+        if self.motion_gate is not None:
+            self.motion_gate.log_stats(f'stream {self.idx} motion gate')
+
+
+def recognize_from_streams():
+    # net initialize (shared by every stream)
+    detector = create_detector(ailia.NETWORK_IMAGE_FORMAT_RGB)
+
+    pose = ailia.Net(POSE_MODEL_PATH, POSE_WEIGHT_PATH, env_id=args.env_id)
+    pose_buffer = PoseInputBuffer(pose)
+
+    if args.prefetch <= 0:
+        logger.info('multi stream mode needs the decode thread, --prefetch set to 1')
+        args.prefetch = 1
+    streams = [Stream(idx, video).start() for idx, video in enumerate(args.video)]
+    logger.info(f'{len(streams)} streams, schedule={args.schedule}')
+
+    # stop by SIGINT (Stop button of the GUI)
+    stop_event = threading.Event()
+    signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+
+    stream_batch = args.stream_batch if args.stream_batch > 0 else len(streams)
+    round_cnt = 0
+    settings_watcher = create_settings_watcher()
+    while not stop_event.is_set():
+        apply_settings(settings_watcher)
+        active = [stream for stream in streams if not stream.done]
+        if len(active) == 0:
+            break
+        if args.schedule == 'deadline':
+            active.sort(key=lambda stream: stream.last_served)
+        else:
+            shift = round_cnt % len(active)
+            active = active[shift:] + active[:shift]
+        round_cnt = round_cnt + 1
+
+        # pick the frames of this round
+        batch = []
+        for stream in active:
+            if len(batch) >= stream_batch:
+                break
+            item = stream.reader.poll()
+            if item is None:
+                continue
+            ret, frame_cnt, timestamp, frame = item
+            if not ret:
+                stream.done = True
+                continue
+            if args.reverse:
+                cv2.flip(frame, 0, dst=frame)
+            stream.last_served = time.time()
+            if stream.motion_gate is not None and not stream.motion_gate.check(frame):
+                # static frame, carry the last results forward
+                stream.prev_events = write_results(
+                    stream.output, pose_buffer.aspect,
+                    carry_result(stream.last_result, (frame_cnt, timestamp, frame)),
+                    stream.prev_events, stream.imgpath, stream.window
+                )
+                continue
+            batch.append((stream, (frame_cnt, timestamp, frame)))
+        if len(batch) == 0:
+            time.sleep(0.001)
+            continue
+
+        # detection of every frame, then one pose inference for all persons
+        detected = [detect_frame(detector, item, stream.tracker) for stream, item in batch]
+        pose_imgs = [item[3] for item in detected]
+        boxes_list = [
+            get_pose_boxes(item[4], pose_buffer.aspect, img)
+            for item, img in zip(detected, pose_imgs)
+        ]
+        for i, (stream, _) in enumerate(batch):
+            if stream.pose_cache is not None:
+                indices = stream.pose_cache.lookup(
+                    pose_imgs[i], detected[i][4].track_ids.tolist(), boxes_list[i]
+                )
+                boxes_list[i] = boxes_list[i][indices]
+        pose_results = compute_crops_multi(
+            pose, pose_imgs, boxes_list, args.pose_batch_size, pose_buffer
+        )
+        pose_results = [
+            stream.pose_cache.merge(result) if stream.pose_cache is not None else result
+            for (stream, _), result in zip(batch, pose_results)
+        ]
+
+        for (stream, _), item, pose_detections in zip(batch, detected, pose_results):
+            frame_cnt, timestamp, frame, img, detections = item
+            result = (
+                frame_cnt, timestamp, frame, detections, pose_detections,
+                get_safety(pose_detections)
+            )
+            stream.last_result = result
+            stream.prev_events = write_results(
+                stream.output, pose_buffer.aspect, result, stream.prev_events, stream.imgpath,
+                stream.window
+            )
+
+        if not args.headless:
+            if (cv2.waitKey(1) & 0xFF == ord('q')):
+                break
+
+    for stream in streams:
+        stream.close()
+        logger.info(f'stream {stream.idx} ({stream.video}) closed')
+    if not args.headless:
+        cv2.destroyAllWindows()
+    logger.info('Script finished successfully.')
+
+
+class InferenceServer:
+    """
+    Persistent inference server of --server. The videos run one at a time
+    in the main thread (for the display window), the commands are handled
+    in the listener threads.
+    """
+
+    def __init__(self):
+        self.base_args = vars(args).copy()
+        self.models = {}
+        self.runs = queue.Queue()
+        self.lock = threading.Lock()
+        self.stop_event = None
+
+    def _stop_current(self):
+        with self.lock:
+            if self.stop_event is not None:
+                self.stop_event.set()
+
+    def _clear_runs(self):
+        while True:
+            try:
+                self.runs.get_nowait()
+            except queue.Empty:
+                return
+
+    def handle(self, command):
+        cmd = command.get('cmd')
+        if cmd == 'run':
+            overrides = command.get('args', {})
+            unknown = [key for key in overrides if key not in self.base_args]
+            if unknown:
+                return {'ok': False, 'error': f'unknown arguments {unknown}'}
+            video = overrides.get('video', self.base_args['video'])
+            if isinstance(video, list):
+                video = video[0] if video else None
+            if video is None:
+                return {'ok': False, 'error': 'no video'}
+            if not is_camera_input(str(video)) and not os.path.isfile(str(video)):
+                return {'ok': False, 'error': f'{video} not found'}
+            # the new run replaces the running and the queued ones
+            self._clear_runs()
+            self._stop_current()
+            self.runs.put(overrides)
+        elif cmd == 'stop':
+            self._clear_runs()
+            self._stop_current()
+        elif cmd == 'reconfigure':
+            overrides = command.get('args', {})
+            unknown = [key for key in overrides if key not in RECONFIGURABLE_ARGS]
+            if unknown:
+                return {'ok': False, 'error': f'not reconfigurable arguments {unknown}'}
+            try:
+                reconfigure(overrides)
+            except (TypeError, ValueError) as e:
+                return {'ok': False, 'error': str(e)}
+        elif cmd == 'status':
+            with self.lock:
+                running = self.stop_event is not None
+            return {'ok': True, 'running': running, 'env_ids': list(self.models)}
+        elif cmd == 'shutdown':
+            self._clear_runs()
+            self._stop_current()
+            self.runs.put(None)
+        else:
+            return {'ok': False, 'error': f'unknown command {cmd}'}
+        return {'ok': True}
+
+    def run(self, overrides):
+        vars(args).clear()
+        vars(args).update(self.base_args)
+        vars(args).update(overrides)
+        if not isinstance(args.video, list):
+            args.video = [str(args.video)]
+
+        with self.lock:
+            self.stop_event = threading.Event()
+        try:
+            if args.env_id not in self.models:
+                logger.info(f'load models for env_id {args.env_id}')
+                self.models[args.env_id] = load_models()
+            recognize_from_video(self.models[args.env_id], self.stop_event)
+        except SystemExit:
+            # sys.exit() of a bad input (e.g. a missing camera) must not
+            # stop the server
+            logger.error(f'run failed: can not open {args.video[0]}')
+        except Exception:
+            logger.exception('run failed')
+        finally:
+            with self.lock:
+                self.stop_event = None
+
+    def serve(self, writer=None):
+        server = CommandServer(
+            self.handle, writer=writer,
+            on_close=lambda: self.handle({'cmd': 'shutdown'})
+        ).start()
+        signal.signal(signal.SIGINT, lambda signum, frame: self.handle({'cmd': 'shutdown'}))
+        while True:
+            try:
+                overrides = self.runs.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if overrides is None:
+                break
+            self.run(overrides)
+        logger.info('Script finished successfully.')
+
+
 def main():
+    sharded = not args.server and args.job_queue is None and \
+        args.video is not None and len(args.video) == 1 and \
+        args.workers != 1 and not is_camera_input(args.video[0])
+    if args.checkpoint is not None or args.resume:
+        # only the single video mode (also run by --server) saves a checkpoint
+        if args.resume and args.checkpoint is None:
+            parser.error('--resume needs --checkpoint')
+        if args.job_queue is not None:
+            parser.error('--checkpoint and --resume can not be used with --job_queue')
+        if sharded:
+            parser.error('--checkpoint and --resume can not be used with --workers')
+        if not args.server and args.video is None:
+            parser.error('--checkpoint and --resume need a video file input')
+        if args.video is not None and len(args.video) > 1:
+            parser.error('--checkpoint and --resume can not be used with several videos')
+        if not args.server and is_camera_input(args.video[0]):
+            parser.error('--checkpoint and --resume need a video file input')
+
+    if args.server:
+        # stdout carries the command replies, before the download prints
+        writer = detach_stdout()
+
     # model files check and download
     check_and_download_models(WEIGHT_PATH, MODEL_PATH, REMOTE_PATH)
     check_and_download_models(
         POSE_WEIGHT_PATH, POSE_MODEL_PATH, POSE_REMOTE_PATH
     )
 
-    if args.video is not None:
+    if args.server:
+        # persistent inference server mode
+        InferenceServer().serve(writer)
+    elif args.job_queue is not None:
+        # job queue worker mode
+        recognize_from_job_queue()
+    elif args.video is not None and len(args.video) > 1:
+        # multi stream mode
+        recognize_from_streams()
+    elif sharded:
+        # sharded video file mode
+        recognize_from_video_shards()
+    elif args.video is not None:
         # video mode
         recognize_from_video()
     else:
         # image mode
         recognize_from_image()
 
+    if buffer_pool is not None:
+        buffer_pool.log_stats()
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,175 @@
+import sys
+import time
+
+import cv2
+import numpy as np
+
+import ailia
+
+# import original modules
+sys.path.append('../../util')
+from utils import get_base_parser, update_parser  # noqa: E402
+from model_utils import check_and_download_models  # noqa: E402
+from pose_resnet_util import compute_batch  # noqa: E402
+from pose_resnet_util import KEYPOINT_SCORE  # noqa: E402
+from safety_util import is_safety, classify_safety  # noqa: E402
+
+# logger
+from logging import getLogger   # noqa: E402
+logger = getLogger(__name__)
+
+
+# ======================
+# Parameters
+# ======================
+POSE_MODEL_NAME = 'pose_resnet_50_256x192'
+POSE_WEIGHT_PATH = f'{POSE_MODEL_NAME}.onnx'
+POSE_MODEL_PATH = f'{POSE_MODEL_NAME}.onnx.prototxt'
+POSE_REMOTE_PATH = 'https://storage.googleapis.com/ailia-models/pose_resnet/'
+
+PERSON_COUNTS = [1, 2, 4, 8, 16, 20]
+CROP_SHAPE = (320, 240, 3)
+SAFETY_PERSON_COUNTS = [1, 10, 100]
+SAFETY_ITERATION = 100
+POSE_THRESHOLD = 0.4
+FRAME_SHAPES = [(720, 1280, 3), (1080, 1920, 3), (2160, 3840, 3)]
+
+TARGETS = ['pose_batch', 'safety', 'frame_copies']
+
+
+# ======================
+# Arguemnt Parser Config
+# ======================
+parser = get_base_parser(
+    'Benchmark of pose_resnet.py', None, None,
+)
+parser.add_argument(
+    '-t', '--target', nargs='*', default=TARGETS, choices=TARGETS,
+    help='Benchmarks to run.'
+)
+parser.add_argument(
+    '--pose_batch_size',
+    default=max(PERSON_COUNTS), type=int,
+    help='The maximum batch size of the batched pose mode.'
+)
+args = update_parser(parser, check_input_type=False)
+
+
+# ======================
+# Benchmark functions
+# ======================
+def measure(func, count):
+    # the first run is excluded as a warm up
+    total_time = 0
+    for i in range(count + 1):
+        start = time.perf_counter()
+        func()
+        end = time.perf_counter()
+        if i != 0:
+            total_time = total_time + (end - start)
+    return total_time * 1000 / count
+
+
+def benchmark_pose_batch():
+    pose = ailia.Net(POSE_MODEL_PATH, POSE_WEIGHT_PATH, env_id=args.env_id)
+
+    rng = np.random.default_rng(0)
+    logger.info('persons\tper-person (ms)\tbatched (ms)\tspeedup')
+    for n in PERSON_COUNTS:
+        crop_imgs = [
+            rng.integers(0, 256, CROP_SHAPE, dtype=np.uint8) for _ in range(n)
+        ]
+        offsets = [0.0] * n
+        scales = [1.0] * n
+
+        def per_person():
+            compute_batch(pose, crop_imgs, offsets, offsets, scales, scales, 1)
+
+        def batched():
+            compute_batch(
+                pose, crop_imgs, offsets, offsets, scales, scales,
+                args.pose_batch_size
+            )
+
+        single_time = measure(per_person, args.benchmark_count)
+        batch_time = measure(batched, args.benchmark_count)
+        logger.info(
+            f'{n}\t{single_time:.2f}\t{batch_time:.2f}\t'
+            f'x{single_time / batch_time:.2f}'
+        )
+
+
+def benchmark_safety():
+    rng = np.random.default_rng(0)
+    logger.info('persons\tscalar (ms)\tvectorized (ms)\tspeedup')
+    for n in SAFETY_PERSON_COUNTS:
+        keypoints = rng.random(
+            (n, ailia.POSE_KEYPOINT_CNT, 4), dtype=np.float32
+        )
+        keypoints[:, :, KEYPOINT_SCORE] += POSE_THRESHOLD / 2
+
+        def scalar():
+            for _ in range(SAFETY_ITERATION):
+                for person in keypoints:
+                    is_safety(person, POSE_THRESHOLD, True, True)
+
+        def vectorized():
+            for _ in range(SAFETY_ITERATION):
+                classify_safety(keypoints, POSE_THRESHOLD, True, True)
+
+        scalar_time = measure(scalar, args.benchmark_count) / SAFETY_ITERATION
+        vector_time = measure(vectorized, args.benchmark_count) / SAFETY_ITERATION
+        logger.info(
+            f'{n}\t{scalar_time:.4f}\t{vector_time:.4f}\t'
+            f'x{scalar_time / vector_time:.2f}'
+        )
+
+
+def benchmark_frame_copies():
+    # per frame conversions of the video loop with --reverse, before: the
+    # flipped copy, BGR to BGRA for the detector and BGRA to BGR for the
+    # pose crops, after: a single in place flip of the decoded frame.
+    # Both start from a fresh copy of the source, standing in for the
+    # decode of the frame.
+    rng = np.random.default_rng(0)
+    logger.info('frame\tbefore (ms)\tafter (ms)\tbefore (MB)\tafter (MB)\tspeedup')
+    for shape in FRAME_SHAPES:
+        source = rng.integers(0, 256, shape, dtype=np.uint8)
+        size = source.nbytes / 1024 / 1024
+
+        def before():
+            frame = source.copy()
+            img = frame[::-1, :, :].copy()
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2BGRA)
+            cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
+
+        def after():
+            frame = source.copy()
+            cv2.flip(frame, 0, dst=frame)
+
+        # bytes read and written, the decode copy included
+        before_size = size * 2 + size * 2 + size * 7 / 3 + size * 7 / 3
+        after_size = size * 2 + size * 2
+        before_time = measure(before, args.benchmark_count)
+        after_time = measure(after, args.benchmark_count)
+        logger.info(
+            f'{shape[1]}x{shape[0]}\t{before_time:.2f}\t{after_time:.2f}\t'
+            f'{before_size:.1f}\t{after_size:.1f}\t'
+            f'x{before_time / after_time:.2f}'
+        )
+
+
+def main():
+    if 'pose_batch' in args.target:
+        check_and_download_models(
+            POSE_WEIGHT_PATH, POSE_MODEL_PATH, POSE_REMOTE_PATH
+        )
+        benchmark_pose_batch()
+    if 'safety' in args.target:
+        benchmark_safety()
+    if 'frame_copies' in args.target:
+        benchmark_frame_copies()
+
+
+if __name__ == '__main__':
+    main()
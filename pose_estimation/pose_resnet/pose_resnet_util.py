@@ -1,5 +1,3 @@
-import math
-
 import cv2
 import numpy as np
 
@@ -7,11 +5,10 @@ import ailia
 
 
 def transform_preds(coords, center, scale, output_size):
-    target_coords = np.zeros(coords.shape)
     trans = get_affine_transform(center, scale, 0, output_size, inv=1)
-    for p in range(coords.shape[0]):
-        target_coords[p, 0:2] = affine_transform(coords[p, 0:2], trans)
-    return target_coords
+    x = coords[:, 0:1].astype(np.float64)
+    y = coords[:, 1:2].astype(np.float64)
+    return x * trans[:, 0] + y * trans[:, 1] + trans[:, 2]
 
 
 def get_affine_transform(center,
@@ -106,127 +103,420 @@ def get_max_preds(batch_heatmaps):
 def get_final_preds(batch_heatmaps, center, scale):
     coords, maxvals = get_max_preds(batch_heatmaps)
 
+    batch_size = batch_heatmaps.shape[0]
+    num_joints = batch_heatmaps.shape[1]
     heatmap_height = batch_heatmaps.shape[2]
     heatmap_width = batch_heatmaps.shape[3]
 
     # post-processing
     if True:  # config.TEST.POST_PROCESS:
-        for n in range(coords.shape[0]):
-            for p in range(coords.shape[1]):
-                hm = batch_heatmaps[n][p]
-                px = int(math.floor(coords[n][p][0] + 0.5))
-                py = int(math.floor(coords[n][p][1] + 0.5))
-                if 1 < px < heatmap_width-1 and 1 < py < heatmap_height-1:
-                    diff = np.array([hm[py][px+1] - hm[py][px-1],
-                                     hm[py+1][px]-hm[py-1][px]])
-                    coords[n][p] += np.sign(diff) * .25
-
-    preds = coords.copy()
+        px = np.floor(coords[:, :, 0] + 0.5).astype(np.int64)
+        py = np.floor(coords[:, :, 1] + 0.5).astype(np.int64)
+        valid = (1 < px) & (px < heatmap_width-1) & \
+                (1 < py) & (py < heatmap_height-1)
+        px = np.clip(px, 1, heatmap_width-2)
+        py = np.clip(py, 1, heatmap_height-2)
+
+        n = np.arange(batch_size)[:, np.newaxis]
+        p = np.arange(num_joints)[np.newaxis, :]
+        diff = np.stack([
+            batch_heatmaps[n, p, py, px+1] - batch_heatmaps[n, p, py, px-1],
+            batch_heatmaps[n, p, py+1, px] - batch_heatmaps[n, p, py-1, px],
+        ], axis=2)
+        coords += np.sign(diff) * .25 * valid[:, :, np.newaxis]
 
     # Transform back
-    for i in range(coords.shape[0]):
-        preds[i] = transform_preds(coords[i], center[i], scale[i],
-                                   [heatmap_width, heatmap_height])
+    trans = np.stack([
+        get_affine_transform(center[i], scale[i], 0,
+                             [heatmap_width, heatmap_height], inv=1)
+        for i in range(batch_size)
+    ])
+    x = coords[:, :, 0:1].astype(np.float64)
+    y = coords[:, :, 1:2].astype(np.float64)
+    trans = trans[:, np.newaxis, :, :]
+    preds = x * trans[..., 0] + y * trans[..., 1] + trans[..., 2]
+    preds = preds.astype(np.float32)
 
     return preds, maxvals
 
 
-def compute(net, original_img, offset_x, offset_y, scale_x, scale_y):
-    shape = net.get_input_shape()
+# BGR format
+MEAN = np.array([0.485, 0.456, 0.406])
+STD = np.array([0.229, 0.224, 0.225])
+
+# (x/255 - mean)/std of every uint8 value, per channel: (3, 256)
+NORMALIZE_LUT = np.ascontiguousarray(
+    ((np.arange(256)[:, np.newaxis]/255.0 - MEAN) / STD).T.astype(np.float32)
+)
+
+
+class PoseInputBuffer:
+    """
+    Reusable float32 (N, 3, H, W) input tensor of the pose network
+    """
+
+    def __init__(self, net):
+        shape = net.get_input_shape()
+        self.height = shape[2]
+        self.width = shape[3]
+        # the crop aspect of keep_aspect(), so that the other threads need
+        # not query the net
+        self.aspect = self.height / self.width
+        self.data = np.zeros((0, 3, self.height, self.width), dtype=np.float32)
+        self.patch = None
+
+    def get(self, n):
+        if self.data.shape[0] < n:
+            capacity = max(n, self.data.shape[0] * 2)
+            self.data = np.zeros(
+                (capacity, 3, self.height, self.width), dtype=np.float32)
+        return self.data[:n]
+
+    def get_patch(self, channels):
+        if self.patch is None or self.patch.shape[2] != channels:
+            self.patch = np.zeros(
+                (self.height, self.width, channels), dtype=np.uint8)
+        return self.patch
+
+
+def get_crop_transform(box, w, h):
+    """
+    Affine matrix mapping the pose input image (w, h) onto box of the
+    source image, to be used with cv2.WARP_INVERSE_MAP. The sampling
+    positions are the same as cv2.resize() of the cropped image.
+    """
+    px1, py1, px2, py2 = box
+    sx = (px2 - px1) / w
+    sy = (py2 - py1) / h
+    return np.array([
+        [sx, 0, px1 + 0.5 * sx - 0.5],
+        [0, sy, py1 + 0.5 * sy - 0.5],
+    ])
+
+
+def preprocess_crop(img, box, buffer, out):
+    """
+    Crop, resize and normalize box of img into out, a (3, H, W) float32 array
+
+    The crop is a single cv2.warpAffine into the reused uint8 patch of
+    buffer, and the normalization is a per-channel table lookup.
+    """
+    patch = buffer.get_patch(img.shape[2])
+    cv2.warpAffine(
+        img, get_crop_transform(box, buffer.width, buffer.height),
+        (buffer.width, buffer.height), dst=patch,
+        flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+        borderMode=cv2.BORDER_REPLICATE
+    )
+    for c in range(3):
+        np.take(NORMALIZE_LUT[c], patch[:, :, c], out=out[c], mode='clip')
+    return out
+
+
+def preprocess_crops(img, boxes, buffer):
+    """
+    Pose input tensor of every box of img
+
+    Parameters
+    ----------
+    img: numpy array
+        Source image (BGR or BGRA)
+    boxes: list of (px1, py1, px2, py2)
+    buffer: PoseInputBuffer
+
+    Returns
+    -------
+    input_data: numpy array
+        (N, 3, H, W) float32 view of buffer
+    """
+    input_data = buffer.get(len(boxes))
+    for i, box in enumerate(boxes):
+        preprocess_crop(img, box, buffer, input_data[i])
+    return input_data
+
+
+def predict_batch(net, input_data, max_batch_size=1):
+    """
+    Run the pose network on a stacked NCHW tensor, max_batch_size at a time.
+
+    Parameters
+    ----------
+    net: ailia.Net
+    input_data: numpy array
+        Pose input tensor of shape (N, 3, H, W)
+    max_batch_size: int
+        Upper limit of the batch dimension given to a single predict
+
+    Returns
+    -------
+    output: numpy array
+        Heatmaps of shape (N, num_joints, heatmap_height, heatmap_width)
+    """
+    max_batch_size = max(1, max_batch_size)
+    outputs = []
+    for start in range(0, input_data.shape[0], max_batch_size):
+        chunk = input_data[start:start + max_batch_size]
+        shape = tuple(net.get_input_shape())
+        if shape[0] != chunk.shape[0]:
+            net.set_input_shape((chunk.shape[0],) + shape[1:])
+        outputs.append(net.predict(chunk))
+    return np.concatenate(outputs, axis=0)
+
+
+# keypoint column layout of PoseResult.keypoints
+KEYPOINT_X = 0
+KEYPOINT_Y = 1
+KEYPOINT_SCORE = 2
+KEYPOINT_INTERPOLATED = 3
+
+# ailia keypoint index -> pose_resnet (coco) joint index
+AILIA_TO_MPI = np.arange(ailia.POSE_KEYPOINT_CNT - 2)
+SHOULDER_CENTER_JOINTS = np.array([
+    ailia.POSE_KEYPOINT_SHOULDER_LEFT, ailia.POSE_KEYPOINT_SHOULDER_RIGHT,
+])
+BODY_CENTER_JOINTS = np.array([
+    ailia.POSE_KEYPOINT_SHOULDER_LEFT, ailia.POSE_KEYPOINT_SHOULDER_RIGHT,
+    ailia.POSE_KEYPOINT_HIP_LEFT, ailia.POSE_KEYPOINT_HIP_RIGHT,
+])
+
+
+class PoseResult:
+    """
+    Pose estimation result of every person in a frame.
+
+    Attributes
+    ----------
+    keypoints: numpy array
+        float32 array of shape (N, ailia.POSE_KEYPOINT_CNT, 4) holding
+        (x, y, score, interpolated) of each keypoint. x and y are
+        normalized by the source image size.
+    total_score: numpy array
+        float32 array of shape (N,)
+    """
+
+    def __init__(self, keypoints):
+        self.keypoints = keypoints
+        self.total_score = keypoints[:, :, KEYPOINT_SCORE].mean(axis=1)
+
+    def __len__(self):
+        return self.keypoints.shape[0]
+
+    def to_ailia(self, idx):
+        """
+        Get the idx-th person as ailia.PoseEstimatorObjectPose
+        """
+        k_list = []
+        for x, y, score, interpolated in self.keypoints[idx].tolist():
+            k_list.append(ailia.PoseEstimatorKeypoint(
+                x=x,
+                y=y,
+                z_local=0,
+                score=score,
+                interpolated=int(interpolated),
+            ))
+
+        return ailia.PoseEstimatorObjectPose(
+            points=k_list,
+            total_score=float(self.total_score[idx]),
+            num_valid_points=ailia.POSE_KEYPOINT_CNT,
+            id=0,
+            angle_x=0,
+            angle_y=0,
+            angle_z=0
+        )
+
+    def to_ailia_list(self):
+        return [self.to_ailia(idx) for idx in range(len(self))]
+
+
+def get_pose_result(preds, maxvals, w, h, offset_x, offset_y, scale_x, scale_y):
+    """
+    Build PoseResult from get_final_preds() outputs
+
+    Parameters
+    ----------
+    preds: numpy array
+        (N, num_joints, 2) keypoint positions in the pose input image
+    maxvals: numpy array
+        (N, num_joints, 1) keypoint scores
+    w, h: int
+        pose input image size
+    offset_x, offset_y, scale_x, scale_y: list of float
+        Position of each crop in the normalized source image coordinates
+
+    Returns
+    -------
+    result: PoseResult
+    """
+    n = preds.shape[0]
+    keypoints = np.zeros((n, ailia.POSE_KEYPOINT_CNT, 4), dtype=np.float32)
+    keypoints[:, AILIA_TO_MPI, KEYPOINT_X:KEYPOINT_Y+1] = preds[:, AILIA_TO_MPI]
+    keypoints[:, AILIA_TO_MPI, KEYPOINT_SCORE] = maxvals[:, AILIA_TO_MPI, 0]
+
+    for j, joints in (
+        (ailia.POSE_KEYPOINT_BODY_CENTER, BODY_CENTER_JOINTS),
+        (ailia.POSE_KEYPOINT_SHOULDER_CENTER, SHOULDER_CENTER_JOINTS),
+    ):
+        keypoints[:, j, KEYPOINT_X:KEYPOINT_Y+1] = \
+            keypoints[:, joints, KEYPOINT_X:KEYPOINT_Y+1].mean(axis=1)
+        keypoints[:, j, KEYPOINT_SCORE] = \
+            keypoints[:, joints, KEYPOINT_SCORE].min(axis=1)
+        keypoints[:, j, KEYPOINT_INTERPOLATED] = 1
+
+    scale = np.stack([
+        np.asarray(scale_x, dtype=np.float32) / w,
+        np.asarray(scale_y, dtype=np.float32) / h,
+    ], axis=1)
+    offset = np.stack([
+        np.asarray(offset_x, dtype=np.float32),
+        np.asarray(offset_y, dtype=np.float32),
+    ], axis=1)
+    keypoints[:, :, KEYPOINT_X:KEYPOINT_Y+1] *= scale[:, np.newaxis, :]
+    keypoints[:, :, KEYPOINT_X:KEYPOINT_Y+1] += offset[:, np.newaxis, :]
+
+    return PoseResult(keypoints)
+
+
+def compute_crops(net, img, boxes, max_batch_size=1, buffer=None):
+    """
+    Estimate the pose of every box of img
+
+    Parameters
+    ----------
+    net: ailia.Net
+    img: numpy array
+        Source image (BGR or BGRA)
+    boxes: list of (px1, py1, px2, py2)
+        Person boxes in pixel, already adjusted by keep_aspect()
+    max_batch_size: int
+        Upper limit of the batch dimension given to a single predict
+    buffer: PoseInputBuffer
+        Reused input tensor. A temporary one is used if None.
+
+    Returns
+    -------
+    result: PoseResult
+    """
+    return compute_crops_multi(
+        net, [img], [boxes], max_batch_size, buffer
+    )[0]
+
+
+def compute_crops_multi(net, imgs, boxes_list, max_batch_size=1, buffer=None):
+    """
+    Estimate the pose of every box of several images (e.g. the frames of
+    several streams) with the crops of all images batched together
+
+    Parameters
+    ----------
+    net: ailia.Net
+    imgs: list of numpy array
+        Source images (BGR or BGRA)
+    boxes_list: list of list of (px1, py1, px2, py2)
+        Person boxes of each image, already adjusted by keep_aspect()
+    max_batch_size: int
+    buffer: PoseInputBuffer
+
+    Returns
+    -------
+    results: list of PoseResult
+        PoseResult of each image
+    """
+    n = sum(len(boxes) for boxes in boxes_list)
+    if n == 0:
+        return [PoseResult(
+            np.zeros((0, ailia.POSE_KEYPOINT_CNT, 4), dtype=np.float32)
+        ) for _ in imgs]
+    if buffer is None:
+        buffer = PoseInputBuffer(net)
+
+    w = buffer.width
+    h = buffer.height
+
+    input_data = buffer.get(n)
+    offset_x = np.zeros(n, dtype=np.float32)
+    offset_y = np.zeros(n, dtype=np.float32)
+    scale_x = np.zeros(n, dtype=np.float32)
+    scale_y = np.zeros(n, dtype=np.float32)
+    i = 0
+    for img, boxes in zip(imgs, boxes_list):
+        for box in boxes:
+            preprocess_crop(img, box, buffer, input_data[i])
+            px1, py1, px2, py2 = box
+            offset_x[i] = px1 / img.shape[1]
+            offset_y[i] = py1 / img.shape[0]
+            scale_x[i] = (px2 - px1) / img.shape[1]
+            scale_y[i] = (py2 - py1) / img.shape[0]
+            i = i + 1
+
+    output = predict_batch(net, input_data, max_batch_size)
 
-    IMAGE_WIDTH = shape[3]
-    IMAGE_HEIGHT = shape[2]
+    center = np.array([w/2, h/2], dtype=np.float32)
+    scale = np.array([1, 1], dtype=np.float32)
+    preds, maxvals = get_final_preds(output, [center] * n, [scale] * n)
+    result = get_pose_result(
+        preds, maxvals, w, h, offset_x, offset_y, scale_x, scale_y
+    )
 
-    src_img = cv2.resize(original_img, (IMAGE_WIDTH, IMAGE_HEIGHT))
+    results = []
+    start = 0
+    for boxes in boxes_list:
+        results.append(PoseResult(result.keypoints[start:start + len(boxes)]))
+        start = start + len(boxes)
+    return results
+
+
+def compute_batch(net, crop_imgs, offset_x, offset_y, scale_x, scale_y,
+                  max_batch_size=1):
+    """
+    Batched version of compute().
+
+    Every crop is resized to the pose input size and stacked into one
+    tensor, so that the pose network runs once per max_batch_size persons
+    instead of once per person.
+
+    Parameters
+    ----------
+    net: ailia.Net
+    crop_imgs: list of numpy array
+        Person crops (BGR)
+    offset_x, offset_y, scale_x, scale_y: list of float
+        Position of each crop in the normalized source image coordinates
+    max_batch_size: int
+
+    Returns
+    -------
+    result: PoseResult
+    """
+    if len(crop_imgs) == 0:
+        return PoseResult(
+            np.zeros((0, ailia.POSE_KEYPOINT_CNT, 4), dtype=np.float32)
+        )
 
-    w = src_img.shape[1]
-    h = src_img.shape[0]
+    buffer = PoseInputBuffer(net)
+    w = buffer.width
+    h = buffer.height
 
-    input_data = src_img
+    input_data = buffer.get(len(crop_imgs))
+    for i, img in enumerate(crop_imgs):
+        box = (0, 0, img.shape[1], img.shape[0])
+        preprocess_crop(img, box, buffer, input_data[i])
+    output = predict_batch(net, input_data, max_batch_size)
 
     center = np.array([w/2, h/2], dtype=np.float32)
     scale = np.array([1, 1], dtype=np.float32)
+    n = len(crop_imgs)
+    preds, maxvals = get_final_preds(output, [center] * n, [scale] * n)
 
-    # BGR format
-    mean = [0.485, 0.456, 0.406]
-    std = [0.229, 0.224, 0.225]
-    input_data = (input_data/255.0 - mean) / std
-    input_data = input_data[np.newaxis, :, :, :].transpose((0, 3, 1, 2))
-
-    output = net.predict(input_data)
-
-    preds, maxvals = get_final_preds(output, [center], [scale])
-
-    k_list = []
-    ailia_to_mpi = [
-        0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, -1, -1
-    ]
-    # ailia_to_coco = [
-    #     0, 14, 15, 16, 17, 2, 5, 3, 6, 4, 8, 11, 7, 9, 12, 10, 13, 1, -1
-    # ]
-    total_score = 0
-    num_valid_points = 0
-    id = 0
-    angle_x = 0
-    angle_y = 0
-    angle_z = 0
-    for j in range(ailia.POSE_KEYPOINT_CNT):
-        i = ailia_to_mpi[j]
-        z = 0
-        interpolated = 0
-        if j == ailia.POSE_KEYPOINT_BODY_CENTER:
-            x = (preds[0, ailia_to_mpi[ailia.POSE_KEYPOINT_SHOULDER_LEFT], 0] +
-                 preds[0, ailia_to_mpi[ailia.POSE_KEYPOINT_SHOULDER_RIGHT], 0] +
-                 preds[0, ailia_to_mpi[ailia.POSE_KEYPOINT_HIP_LEFT], 0] +
-                 preds[0, ailia_to_mpi[ailia.POSE_KEYPOINT_HIP_RIGHT], 0])/4
-            y = (preds[0, ailia_to_mpi[ailia.POSE_KEYPOINT_SHOULDER_LEFT], 1] +
-                 preds[0, ailia_to_mpi[ailia.POSE_KEYPOINT_SHOULDER_RIGHT], 1] +
-                 preds[0, ailia_to_mpi[ailia.POSE_KEYPOINT_HIP_LEFT], 1] +
-                 preds[0, ailia_to_mpi[ailia.POSE_KEYPOINT_HIP_RIGHT], 1])/4
-            score = min(min(min(
-                maxvals[0, ailia_to_mpi[ailia.POSE_KEYPOINT_SHOULDER_LEFT], 0],
-                maxvals[0, ailia_to_mpi[ailia.POSE_KEYPOINT_SHOULDER_RIGHT], 0]),
-                maxvals[0, ailia_to_mpi[ailia.POSE_KEYPOINT_HIP_LEFT], 0]),
-                maxvals[0, ailia_to_mpi[ailia.POSE_KEYPOINT_HIP_RIGHT], 0])
-            interpolated = 1
-        elif j == ailia.POSE_KEYPOINT_SHOULDER_CENTER:
-            x = (preds[0, ailia_to_mpi[ailia.POSE_KEYPOINT_SHOULDER_LEFT], 0] +
-                 preds[0, ailia_to_mpi[ailia.POSE_KEYPOINT_SHOULDER_RIGHT], 0])/2
-            y = (preds[0, ailia_to_mpi[ailia.POSE_KEYPOINT_SHOULDER_LEFT], 1] +
-                 preds[0, ailia_to_mpi[ailia.POSE_KEYPOINT_SHOULDER_RIGHT], 1])/2
-            score = min(maxvals[0, ailia_to_mpi[ailia.POSE_KEYPOINT_SHOULDER_LEFT]],
-                        maxvals[0, ailia_to_mpi[ailia.POSE_KEYPOINT_SHOULDER_RIGHT]])
-            interpolated = 1
-        else:
-            x = preds[0, i, 0]
-            y = preds[0, i, 1]
-            score = maxvals[0, i, 0]
-
-        num_valid_points = num_valid_points+1
-        total_score = total_score+score
-
-        k = ailia.PoseEstimatorKeypoint(
-            x=x / src_img.shape[1] * scale_x + offset_x,
-            y=y / src_img.shape[0] * scale_y + offset_y,
-            z_local=z,
-            score=score,
-            interpolated=interpolated,
-        )
-        k_list.append(k)
-
-    total_score = total_score/num_valid_points
-
-    r = ailia.PoseEstimatorObjectPose(
-        points=k_list,
-        total_score=total_score,
-        num_valid_points=num_valid_points,
-        id=id,
-        angle_x=angle_x,
-        angle_y=angle_y,
-        angle_z=angle_z
+    return get_pose_result(
+        preds, maxvals, w, h, offset_x, offset_y, scale_x, scale_y
     )
 
-    return r
+
+def compute(net, original_img, offset_x, offset_y, scale_x, scale_y):
+    return compute_batch(
+        net, [original_img], [offset_x], [offset_y], [scale_x], [scale_y]
+    ).to_ailia(0)
 
 
 def keep_aspect(top_left, bottom_right, pose_img, pose):
@@ -259,3 +549,130 @@ def keep_aspect(top_left, bottom_right, pose_img, pose):
     px1 = max(0, px1)
     px2 = min(pose_img.shape[1], px2)
     return px1, py1, px2, py2
+
+
+def get_input_aspect(net):
+    """
+    Height / width of the pose input, the crop aspect of keep_aspect()
+    """
+    shape = net.get_input_shape()
+    return shape[2]/shape[3]
+
+
+def keep_aspect_boxes(boxes, img_h, img_w, aspect):
+    """
+    Vectorized keep_aspect() of several boxes
+
+    Parameters
+    ----------
+    boxes: numpy array
+        (N, 4) int boxes of px1, py1, px2, py2 in pixel
+    img_h: int
+    img_w: int
+    aspect: float
+        Height / width of the pose input
+
+    Returns
+    -------
+    boxes: numpy array
+        (N, 4) int32 crop boxes
+    """
+    boxes = np.asarray(boxes).reshape(-1, 4)
+    px1 = np.maximum(0, boxes[:, 0]).astype(np.float64)
+    py1 = np.maximum(0, boxes[:, 1]).astype(np.float64)
+    px2 = np.minimum(img_w, boxes[:, 2]).astype(np.float64)
+    py2 = np.minimum(img_h, boxes[:, 3]).astype(np.float64)
+
+    ow = px2 - px1
+    oh = py2 - py1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        wide = aspect <= oh / ow
+        w = oh / aspect
+        h = ow * aspect
+    px1 = np.where(wide, px1 - (w - ow) / 2, px1)
+    px2 = np.where(wide, px1 + w, px2)
+    py1 = np.where(wide, py1, py1 - (h - oh) / 2)
+    py2 = np.where(wide, py2, py1 + h)
+
+    crops = np.stack([px1, py1, px2, py2], axis=1)
+    crops = crops.astype(np.int32)
+    np.maximum(crops[:, :2], 0, out=crops[:, :2])
+    np.minimum(crops[:, 2:], (img_w, img_h), out=crops[:, 2:])
+    return crops
+
+
+CATEGORY_PERSON = 0
+
+
+class PersonDetections:
+    """
+    Person detections of a frame, extracted once from the detector result
+    and shared by the pose estimation, the csv events and the drawing.
+
+    Attributes
+    ----------
+    boxes: numpy array
+        float32 array of shape (N, 4) holding x1, y1, x2, y2 normalized by
+        the frame size
+    scores: numpy array
+        float32 array of shape (N,)
+    pixel_boxes: numpy array
+        int32 array of shape (N, 4), boxes in pixel of the frame
+    track_ids: numpy array
+        int64 array of shape (N,), or None without tracker
+    """
+
+    def __init__(self, boxes, scores, pixel_boxes, img_h, img_w, track_ids=None):
+        self.boxes = boxes
+        self.scores = scores
+        self.pixel_boxes = pixel_boxes
+        self.img_h = img_h
+        self.img_w = img_w
+        self.track_ids = track_ids
+        # aspect -> crop boxes
+        self.crop_boxes = {}
+
+    @classmethod
+    def from_objects(cls, objects, img_h, img_w, tracked=False):
+        """
+        Parameters
+        ----------
+        objects: list of ailia.DetectorObject
+            Detections of every category (with track_id if tracked)
+        img_h: int
+        img_w: int
+        tracked: bool
+            Whether the objects come from a tracker, even if there is no
+            person in the frame
+        """
+        persons = [obj for obj in objects if obj.category == CATEGORY_PERSON]
+        xywh = np.array(
+            [(obj.x, obj.y, obj.w, obj.h) for obj in persons], dtype=np.float64
+        ).reshape(-1, 4)
+        corners = np.concatenate([xywh[:, :2], xywh[:, :2] + xywh[:, 2:]], axis=1)
+        pixel_boxes = (corners * (img_w, img_h, img_w, img_h)).astype(np.int32)
+        scores = np.array([obj.prob for obj in persons], dtype=np.float32)
+        track_ids = None
+        if tracked:
+            track_ids = np.array([obj.track_id for obj in persons], dtype=np.int64)
+        return cls(
+            corners.astype(np.float32), scores, pixel_boxes, img_h, img_w, track_ids
+        )
+
+    def __len__(self):
+        return self.boxes.shape[0]
+
+    def get_crop_boxes(self, aspect):
+        """
+        keep_aspect() crop boxes of every person, computed once per aspect
+
+        Returns
+        -------
+        boxes: numpy array
+            (N, 4) int32 of px1, py1, px2, py2
+        """
+        if aspect not in self.crop_boxes:
+            self.crop_boxes[aspect] = keep_aspect_boxes(
+                self.pixel_boxes, self.img_h, self.img_w, aspect
+            )
+        return self.crop_boxes[aspect]
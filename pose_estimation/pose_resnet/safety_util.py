@@ -0,0 +1,132 @@
+import math
+
+import numpy as np
+
+import ailia
+
+from pose_resnet_util import KEYPOINT_X, KEYPOINT_Y, KEYPOINT_SCORE
+
+# safety status codes
+STATUS_SAFETY = 0
+STATUS_SITTING = 1
+STATUS_FALLEN = 2
+STATUS_NAMES = ['Safety', 'Sitting', 'Fallen']
+
+# allowed head-body angle range (degree) when standing
+SAFETY_ANGLE_MIN = 30
+SAFETY_ANGLE_MAX = 180 - 30
+
+
+def is_safety(keypoints, threshold, category_fallen, category_sitting):
+    """
+    Classify one person (scalar reference of classify_safety())
+
+    Parameters
+    ----------
+    keypoints: numpy array
+        (ailia.POSE_KEYPOINT_CNT, 4) keypoints of PoseResult
+    threshold: float
+        pose threshold
+    category_fallen: bool
+    category_sitting: bool
+
+    Returns
+    -------
+    safety: bool
+    status: str
+    """
+    theta = 0
+    status = ""
+
+    nose = keypoints[ailia.POSE_KEYPOINT_NOSE]
+    body_center = keypoints[ailia.POSE_KEYPOINT_BODY_CENTER]
+    hip_left = keypoints[ailia.POSE_KEYPOINT_HIP_LEFT]
+    hip_right = keypoints[ailia.POSE_KEYPOINT_HIP_RIGHT]
+    knee_left = keypoints[ailia.POSE_KEYPOINT_KNEE_LEFT]
+    knee_right = keypoints[ailia.POSE_KEYPOINT_KNEE_RIGHT]
+
+    if category_sitting:
+        # 膝がヒップよりも上にある
+        if hip_left[KEYPOINT_SCORE] > threshold and knee_left[KEYPOINT_SCORE] > threshold:
+            if hip_left[KEYPOINT_Y] > knee_left[KEYPOINT_Y]:
+                return False, "(Hip > Knee)"
+        if hip_right[KEYPOINT_SCORE] > threshold and knee_right[KEYPOINT_SCORE] > threshold:
+            if hip_right[KEYPOINT_Y] > knee_right[KEYPOINT_Y]:
+                return False, "(Hip > Knee)"
+
+    if category_fallen:
+        # 頭が横にある
+        if nose[KEYPOINT_SCORE] > threshold and body_center[KEYPOINT_SCORE]:
+            theta = math.atan2(-(nose[KEYPOINT_Y] - body_center[KEYPOINT_Y]),
+                                nose[KEYPOINT_X] - body_center[KEYPOINT_X])
+            theta = 180 * theta / math.pi
+            status = "(Head Body angle " + str(int(theta)) + ")"
+            if not (theta >= SAFETY_ANGLE_MIN and theta <= SAFETY_ANGLE_MAX):
+                return False, status
+
+    return True, status
+
+
+def classify_safety(keypoints, threshold, category_fallen, category_sitting):
+    """
+    Classify every person of a frame at once
+
+    Parameters
+    ----------
+    keypoints: numpy array
+        (N, ailia.POSE_KEYPOINT_CNT, 4) keypoints of PoseResult
+    threshold: float
+        pose threshold
+    category_fallen: bool
+    category_sitting: bool
+
+    Returns
+    -------
+    status: numpy array
+        (N,) int array of STATUS_SAFETY, STATUS_SITTING or STATUS_FALLEN
+    theta: numpy array
+        (N,) head-body angle in degree, nan where it was not evaluated
+    """
+    n = keypoints.shape[0]
+    status = np.full(n, STATUS_SAFETY, dtype=np.int32)
+    theta = np.full(n, np.nan)
+
+    if category_fallen:
+        nose = keypoints[:, ailia.POSE_KEYPOINT_NOSE]
+        body_center = keypoints[:, ailia.POSE_KEYPOINT_BODY_CENTER]
+        valid = (nose[:, KEYPOINT_SCORE] > threshold) & \
+            (body_center[:, KEYPOINT_SCORE] != 0)
+        dy = -(nose[:, KEYPOINT_Y] - body_center[:, KEYPOINT_Y])
+        dx = nose[:, KEYPOINT_X] - body_center[:, KEYPOINT_X]
+        angle = 180 * np.arctan2(
+            dy.astype(np.float64), dx.astype(np.float64)) / math.pi
+        theta[valid] = angle[valid]
+        fallen = valid & ~(
+            (angle >= SAFETY_ANGLE_MIN) & (angle <= SAFETY_ANGLE_MAX))
+        status[fallen] = STATUS_FALLEN
+
+    if category_sitting:
+        # left and right side at once
+        hips = keypoints[:, [ailia.POSE_KEYPOINT_HIP_LEFT,
+                             ailia.POSE_KEYPOINT_HIP_RIGHT]]
+        knees = keypoints[:, [ailia.POSE_KEYPOINT_KNEE_LEFT,
+                              ailia.POSE_KEYPOINT_KNEE_RIGHT]]
+        sitting = (hips[:, :, KEYPOINT_SCORE] > threshold) & \
+            (knees[:, :, KEYPOINT_SCORE] > threshold) & \
+            (hips[:, :, KEYPOINT_Y] > knees[:, :, KEYPOINT_Y])
+        sitting = sitting.any(axis=1)
+        status[sitting] = STATUS_SITTING
+        theta[sitting] = np.nan
+
+    return status, theta
+
+
+def get_status_text(status, theta):
+    """
+    Status text of one person, same as the one of is_safety()
+    """
+    if status == STATUS_SITTING:
+        return "(Hip > Knee)"
+    if np.isnan(theta):
+        return ""
+    return "(Head Body angle " + str(int(theta)) + ")"
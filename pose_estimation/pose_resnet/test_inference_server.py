@@ -0,0 +1,98 @@
+import json
+import os
+import sys
+
+import pytest
+
+pytest.importorskip('ailia')
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../util'))
+from ipc_utils import CommandServer, send_command  # noqa: E402
+
+# a camera index no machine has
+INVALID_CAMERA = '99'
+
+
+@pytest.fixture
+def pipes():
+    # the stdin and stdout pipes of a server process
+    stdin_r, stdin_w = os.pipe()
+    stdout_r, stdout_w = os.pipe()
+    files = [
+        os.fdopen(stdin_r, 'rb'), os.fdopen(stdin_w, 'wb'),
+        os.fdopen(stdout_r, 'rb'), os.fdopen(stdout_w, 'wb'),
+    ]
+    yield files
+    # the end of stdin first, the reader thread of the server holds stdin
+    # until then
+    for f in files[1:] + files[:1]:
+        f.close()
+
+
+def test_invalid_camera_keeps_server(pose_resnet, pipes):
+    server_in, client_out, client_in, server_out = pipes
+    server = pose_resnet.InferenceServer()
+    CommandServer(server.handle, server_in, server_out).start()
+
+    reply = send_command(
+        client_out, client_in, {'cmd': 'run', 'args': {'video': INVALID_CAMERA}}
+    )
+    assert reply['ok']
+
+    # the run of the main loop of serve(), sys.exit() inside
+    server.run(server.runs.get(timeout=5))
+
+    reply = send_command(client_out, client_in, {'cmd': 'status'})
+    assert reply['ok']
+    assert not reply['running']
+
+
+def test_end_of_stdin_shuts_down(pose_resnet, pipes):
+    server_in, client_out, client_in, server_out = pipes
+    server = pose_resnet.InferenceServer()
+    CommandServer(
+        server.handle, server_in, server_out,
+        on_close=lambda: server.handle({'cmd': 'shutdown'})
+    ).start()
+
+    assert send_command(client_out, client_in, {'cmd': 'status'})['ok']
+    client_out.close()
+    assert server.runs.get(timeout=5) is None
+
+
+def test_bad_command_is_rejected(pose_resnet, pipes):
+    server_in, client_out, client_in, server_out = pipes
+    server = pose_resnet.InferenceServer()
+    CommandServer(server.handle, server_in, server_out).start()
+
+    client_out.write(b'not json\n[]\n')
+    client_out.flush()
+    assert not json.loads(client_in.readline())['ok']
+    assert not json.loads(client_in.readline())['ok']
+    # the server keeps reading
+    assert send_command(client_out, client_in, {'cmd': 'status'})['ok']
+
+
+def test_missing_file_is_rejected(pose_resnet):
+    server = pose_resnet.InferenceServer()
+    reply = server.handle({'cmd': 'run', 'args': {'video': 'not_found.mp4'}})
+    assert not reply['ok']
+    assert server.runs.empty()
+
+
+def test_reconfigure_parses_bools(pose_resnet, monkeypatch):
+    monkeypatch.setattr(pose_resnet.args, 'category_fallen', True)
+    monkeypatch.setattr(pose_resnet.args, 'pose_threshold', 0.5)
+    server = pose_resnet.InferenceServer()
+
+    reply = server.handle({'cmd': 'reconfigure', 'args': {'category_fallen': 'false'}})
+    assert reply['ok']
+    assert pose_resnet.args.category_fallen is False
+
+    # nothing is applied from an invalid command
+    reply = server.handle({'cmd': 'reconfigure', 'args': {
+        'pose_threshold': 0.1, 'category_fallen': 'yes'
+    }})
+    assert not reply['ok']
+    assert pose_resnet.args.category_fallen is False
+    assert pose_resnet.args.pose_threshold == 0.5
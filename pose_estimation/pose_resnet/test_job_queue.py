@@ -0,0 +1,45 @@
+import os
+import sys
+
+import pytest
+
+pytest.importorskip('ailia')
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../util'))
+from job_queue_utils import JobQueue  # noqa: E402
+
+
+@pytest.fixture
+def job_queue(tmp_path):
+    return JobQueue(str(tmp_path))
+
+
+def add_job(job_queue, name, data):
+    with open(os.path.join(job_queue.queue_dir, name), 'wb') as f:
+        f.write(data)
+    return job_queue.claim()
+
+
+def test_unreadable_video_fails(pose_resnet, job_queue, monkeypatch):
+    monkeypatch.setattr(pose_resnet.args, 'imgpath', None)
+    job = add_job(job_queue, 'broken.mp4', b'not a video')
+    try:
+        with pytest.raises(IOError):
+            pose_resnet.process_job(None, None, None, job, None)
+    finally:
+        job.fail()
+    assert os.listdir(job_queue.done_dir) == []
+
+
+def test_partial_outputs_are_removed(pose_resnet, job_queue, monkeypatch):
+    monkeypatch.setattr(pose_resnet.args, 'imgpath', 'img')
+    job = add_job(job_queue, 'video.mp4', b'')
+    _, csvpath, imgpath = pose_resnet.get_job_outputs(job)
+    with open(csvpath, 'w') as f:
+        f.write('frame\n')
+    os.makedirs(imgpath)
+
+    pose_resnet.remove_job_outputs(job)
+    job.release()
+    assert os.listdir(job_queue.done_dir) == []
+    assert job_queue.pending() == ['video.mp4']
@@ -0,0 +1,77 @@
+import threading
+
+import numpy as np
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+
+# free buffers kept per shape and dtype
+BUFFER_POOL_SIZE = 16
+
+
+class BufferPool:
+    """
+    Reusable numpy arrays keyed by shape and dtype.
+
+    acquire() gives a released array of the same shape and dtype (a hit),
+    or a new one (a miss). release() keeps at most max_buffers free arrays
+    per key, the others are left to the garbage collector. An array must
+    not be used after its release. acquire() and release() may be called
+    from different threads.
+
+    Parameters
+    ----------
+    max_buffers: int
+        Free arrays kept per shape and dtype
+    """
+
+    def __init__(self, max_buffers=BUFFER_POOL_SIZE):
+        self.max_buffers = max_buffers
+        # (shape, dtype) -> list of free arrays
+        self.free = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+
+    def acquire(self, shape, dtype=np.uint8):
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self.lock:
+            buffers = self.free.get(key)
+            if buffers:
+                self.hits = self.hits + 1
+                return buffers.pop()
+            self.misses = self.misses + 1
+        return np.empty(shape, dtype)
+
+    def release(self, array):
+        # views would hand out memory still used by their base
+        if array is None or not array.flags.owndata:
+            return
+        key = (array.shape, array.dtype.str)
+        with self.lock:
+            buffers = self.free.setdefault(key, [])
+            if any(buffer is array for buffer in buffers):
+                return
+            if len(buffers) < self.max_buffers:
+                buffers.append(array)
+            else:
+                self.discarded = self.discarded + 1
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0
+
+    def log_stats(self, name='buffer pool'):
+        with self.lock:
+            count = sum(len(buffers) for buffers in self.free.values())
+            size = sum(
+                buffer.nbytes for buffers in self.free.values() for buffer in buffers
+            )
+        logger.info(
+            f'{name}: {self.hits} hits, {self.misses} misses '
+            f'(hit rate {self.hit_rate() * 100:.1f}%), {self.discarded} discarded, '
+            f'{count} free buffers ({size / 1024 / 1024:.1f} MB, '
+            f'limit {self.max_buffers} per shape)'
+        )
@@ -0,0 +1,59 @@
+import json
+import os
+import time
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+
+# seconds between periodic checkpoints
+CHECKPOINT_INTERVAL = 30
+
+
+class Checkpoint:
+    """
+    Progress file of a long running job, saved atomically (write to a
+    temporary file and rename) so that an interruption at any time leaves
+    either the previous or the new checkpoint.
+
+    Parameters
+    ----------
+    path: str
+        Path of the checkpoint json file
+    interval: float
+        Seconds between periodic checkpoints of due()
+    """
+
+    def __init__(self, path, interval=CHECKPOINT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.last_save = time.time()
+
+    def load(self):
+        """
+        Returns
+        -------
+        state: dict
+            The saved state, or None if there is no checkpoint
+        """
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path) as f:
+            return json.load(f)
+
+    def due(self):
+        return self.interval <= time.time() - self.last_save
+
+    def save(self, state):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.last_save = time.time()
+        logger.debug(f'checkpoint saved: {state}')
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
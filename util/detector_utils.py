@@ -10,6 +10,7 @@ logger = getLogger(__name__)
 
 sys.path.append(os.path.dirname(__file__))
 from image_utils import imread  # noqa: E402
+from letterbox_utils import get_letterbox_geometry, letterbox_canvas, letterbox_into  # noqa: E402
 
 
 def preprocessing_img(img):
@@ -41,6 +42,10 @@ def letterbox_convert(frame, det_shape):
     """
     Adjust the size of the frame from the webcam to the ailia input shape.
 
+    If the frame edges map to whole input pixels, the frame is resized
+    directly into the output without the full size padded canvas, with the
+    same output (see LetterboxGeometry).
+
     Parameters
     ----------
     frame: numpy array
@@ -53,21 +58,11 @@ def letterbox_convert(frame, det_shape):
         Resized `img` as well as adapt the scale
     """
     height, width = det_shape[0], det_shape[1]
-    f_height, f_width = frame.shape[0], frame.shape[1]
-    scale = np.max((f_height / height, f_width / width))
-
-    # padding base
-    img = np.zeros(
-        (int(round(scale * height)), int(round(scale * width)), 3),
-        np.uint8
-    )
-    start = (np.array(img.shape) - np.array(frame.shape)) // 2
-    img[
-        start[0]: start[0] + f_height,
-        start[1]: start[1] + f_width
-    ] = frame
-    resized_img = cv2.resize(img, (width, height))
-    return resized_img
+    geometry = get_letterbox_geometry(frame.shape[0], frame.shape[1], height, width)
+    if not geometry.exact:
+        return letterbox_canvas(frame, geometry)
+    resized_img = np.zeros((height, width) + frame.shape[2:], np.uint8)
+    return letterbox_into(frame, geometry, resized_img)
 
 
 def reverse_letterbox(detections, img, det_shape):
@@ -96,6 +91,39 @@ def reverse_letterbox(detections, img, det_shape):
     return new_detections
 
 
+def reverse_letterbox_boxes(boxes, img, det_shape):
+    """
+    Vectorized reverse_letterbox() of a box array
+
+    Parameters
+    ----------
+    boxes: numpy array
+        (N, 4) x1, y1, x2, y2 normalized by the letterboxed image
+    img: numpy array
+        Original image
+    det_shape: tuple
+        ailia model input (height,width)
+
+    Returns
+    -------
+    boxes: numpy array
+        (N, 4) float32 x1, y1, x2, y2 normalized by img
+    """
+    h, w = img.shape[0], img.shape[1]
+
+    pad_x = pad_y = 0
+    if det_shape is not None:
+        scale = np.max((h / det_shape[0], w / det_shape[1]))
+        start = (det_shape[0:2] - np.array(img.shape[0:2]) / scale) // 2
+        pad_x = start[1] * scale
+        pad_y = start[0] * scale
+
+    scale = np.array([(w + pad_x * 2) / w, (h + pad_y * 2) / h] * 2)
+    offset = np.array([pad_x / w, pad_y / h] * 2)
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    return (boxes * scale - offset).astype(np.float32)
+
+
 def plot_results(detector, img, category=None, segm_masks=None, logging=True):
     """
     :param detector: ailia.Detector, or list of ailia.DetectorObject
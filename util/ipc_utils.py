@@ -0,0 +1,142 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+
+class CommandServer:
+    """
+    Command server on the stdin / stdout pipes of a child process. Each
+    line read is a json command dict, and the json reply dict of
+    handler(command) is written back as one line. Only the parent process,
+    which holds the other ends of the pipes, can send commands.
+
+    Parameters
+    ----------
+    handler: callable
+        Returns the reply dict of a command dict. Called from the reader
+        thread, so it must be thread safe.
+    reader: binary file
+        Default: sys.stdin
+    writer: binary file
+        Default: the stdout of detach_stdout()
+    on_close: callable
+        Called once the reader is closed (e.g. the parent exited)
+    """
+
+    def __init__(self, handler, reader=None, writer=None, on_close=None):
+        self.handler = handler
+        self.reader = reader if reader is not None else sys.stdin.buffer
+        self.writer = writer if writer is not None else detach_stdout()
+        self.on_close = on_close
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+        logger.info('command server reading the commands from stdin')
+        return self
+
+    def _serve(self):
+        for line in self.reader:
+            if not line.strip():
+                continue
+            try:
+                command = json.loads(line)
+                if not isinstance(command, dict):
+                    raise ValueError('a command must be a json object')
+                reply = self.handler(command)
+            except Exception as e:
+                logger.exception(f'command {line!r} failed')
+                reply = {'ok': False, 'error': str(e)}
+            try:
+                self.writer.write(json.dumps(reply).encode('utf-8') + b'\n')
+                self.writer.flush()
+            except (OSError, ValueError):
+                break
+        if self.on_close is not None:
+            self.on_close()
+
+
+def detach_stdout():
+    """
+    Keep the stdout pipe for the replies only: print() and the native
+    libraries write to stderr from now on. Call it before anything is
+    printed.
+
+    Returns
+    -------
+    writer: binary file
+        The original stdout
+    """
+    sys.stdout.flush()
+    writer = os.fdopen(os.dup(sys.stdout.fileno()), 'wb')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    return writer
+
+
+def send_command(writer, reader, command):
+    """
+    Send one command to CommandServer and return its reply.
+
+    Raises
+    ------
+    ConnectionError
+        The server closed its stdout (e.g. it exited)
+    """
+    writer.write(json.dumps(command).encode('utf-8') + b'\n')
+    writer.flush()
+    while True:
+        line = reader.readline()
+        if not line:
+            raise ConnectionError('command server exited')
+        try:
+            reply = json.loads(line)
+        except ValueError:
+            # output printed before detach_stdout()
+            logger.debug(f'skip {line!r}')
+            continue
+        if isinstance(reply, dict):
+            return reply
+
+
+class CommandClient:
+    """
+    Start a CommandServer child process and send commands to it. send()
+    may be called from several threads, the commands are serialized.
+
+    Parameters
+    ----------
+    cmd: list of str
+        Command line of the child
+    cwd: str
+    """
+
+    def __init__(self, cmd, cwd=None):
+        self.proc = subprocess.Popen(
+            cmd, cwd=cwd, stdin=subprocess.PIPE, stdout=subprocess.PIPE
+        )
+        self.lock = threading.Lock()
+
+    def send(self, command):
+        with self.lock:
+            try:
+                return send_command(self.proc.stdin, self.proc.stdout, command)
+            except (OSError, ValueError) as e:
+                # OSError: a broken pipe, ValueError: the pipe closed
+                raise ConnectionError('command server exited') from e
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def close(self):
+        # the server shuts down at the end of its stdin
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        self.proc.wait()
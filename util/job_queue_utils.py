@@ -0,0 +1,190 @@
+import os
+import socket
+import threading
+import time
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+
+RUNNING_DIR = 'running'
+DONE_DIR = 'done'
+FAILED_DIR = 'failed'
+
+# a claim without heartbeat for this many seconds is given back to the queue
+STALE_TIMEOUT = 600
+HEARTBEAT_INTERVAL = 30
+
+VIDEO_EXTENSIONS = ['.mp4', '.avi', '.mov', '.mkv', '.wmv', '.m4v']
+
+
+def get_worker_id():
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+class Job:
+    """
+    A claimed job. The job file stays in the running directory while it is
+    processed, and its mtime is refreshed by a heartbeat thread so that
+    other workers do not recover it as stale.
+    """
+
+    def __init__(self, job_queue, name):
+        self.job_queue = job_queue
+        self.name = name
+        self.path = os.path.join(job_queue.running_dir, name)
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def _heartbeat(self):
+        while not self.stop_event.wait(self.job_queue.heartbeat_interval):
+            try:
+                os.utime(self.path)
+            except FileNotFoundError:
+                logger.warning(f'job {self.name}: claim lost')
+                return
+
+    def start_heartbeat(self):
+        self.thread = threading.Thread(target=self._heartbeat, daemon=True)
+        self.thread.start()
+        return self
+
+    def _stop_heartbeat(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def output_path(self, suffix):
+        """
+        Result path next to the finished job, <job name stem><suffix>
+        """
+        stem = os.path.splitext(self.name)[0]
+        return os.path.join(self.job_queue.done_dir, stem + suffix)
+
+    def _move(self, directory):
+        self._stop_heartbeat()
+        try:
+            os.rename(self.path, os.path.join(directory, self.name))
+        except FileNotFoundError:
+            logger.warning(f'job {self.name}: claim lost')
+
+    def complete(self):
+        self._move(self.job_queue.done_dir)
+        logger.info(f'job {self.name}: done')
+
+    def fail(self):
+        self._move(self.job_queue.failed_dir)
+        logger.info(f'job {self.name}: failed')
+
+    def release(self):
+        """
+        Give the job back to the queue unprocessed
+        """
+        self._move(self.job_queue.queue_dir)
+        logger.info(f'job {self.name}: released')
+
+
+class JobQueue:
+    """
+    Directory based job queue shared by workers on one or several hosts.
+
+    Pending jobs are the files in queue_dir. A worker claims a job by
+    renaming it into queue_dir/running, which succeeds for exactly one
+    worker, and moves it to queue_dir/done or queue_dir/failed at the end.
+    No central service is needed, and the directory may be on a network
+    filesystem with atomic rename.
+
+    Files starting with '.' are ignored, so producers can copy a job as a
+    hidden file and rename it when complete. A job whose worker died is
+    given back to the queue after stale_timeout seconds without heartbeat,
+    so a job is processed at least once.
+
+    Parameters
+    ----------
+    queue_dir: str
+    stale_timeout: float
+    heartbeat_interval: float
+    extensions: list of str
+        Accepted job file extensions, or None to accept every file
+    """
+
+    def __init__(self, queue_dir, stale_timeout=STALE_TIMEOUT,
+                 heartbeat_interval=HEARTBEAT_INTERVAL,
+                 extensions=VIDEO_EXTENSIONS):
+        self.queue_dir = queue_dir
+        self.running_dir = os.path.join(queue_dir, RUNNING_DIR)
+        self.done_dir = os.path.join(queue_dir, DONE_DIR)
+        self.failed_dir = os.path.join(queue_dir, FAILED_DIR)
+        self.stale_timeout = stale_timeout
+        self.heartbeat_interval = min(heartbeat_interval, stale_timeout / 3)
+        self.extensions = extensions
+        self.worker_id = get_worker_id()
+        for directory in [self.running_dir, self.done_dir, self.failed_dir]:
+            os.makedirs(directory, exist_ok=True)
+
+    def _is_job(self, name):
+        if name.startswith('.'):
+            return False
+        if not os.path.isfile(os.path.join(self.queue_dir, name)):
+            return False
+        if self.extensions is None:
+            return True
+        return os.path.splitext(name)[1].lower() in self.extensions
+
+    def pending(self):
+        return sorted(
+            name for name in os.listdir(self.queue_dir) if self._is_job(name)
+        )
+
+    def claim(self):
+        """
+        Claim the first pending job
+
+        Returns
+        -------
+        job: Job
+            The claimed job with running heartbeat, or None if the queue is
+            empty
+        """
+        for name in self.pending():
+            try:
+                os.rename(
+                    os.path.join(self.queue_dir, name),
+                    os.path.join(self.running_dir, name)
+                )
+            except (FileNotFoundError, FileExistsError):
+                # claimed by another worker
+                continue
+            job = Job(self, name)
+            try:
+                # the mtime of the claimed file is the heartbeat
+                os.utime(job.path)
+            except FileNotFoundError:
+                continue
+            logger.info(f'job {name}: claimed by {self.worker_id}')
+            return job.start_heartbeat()
+        return None
+
+    def recover_stale(self):
+        """
+        Give the claims without heartbeat back to the queue
+
+        Returns
+        -------
+        count: int
+            the number of recovered jobs
+        """
+        count = 0
+        now = time.time()
+        for name in os.listdir(self.running_dir):
+            path = os.path.join(self.running_dir, name)
+            try:
+                if now - os.stat(path).st_mtime < self.stale_timeout:
+                    continue
+                os.rename(path, os.path.join(self.queue_dir, name))
+            except FileNotFoundError:
+                continue
+            logger.info(f'job {name}: stale claim recovered')
+            count = count + 1
+        return count
@@ -0,0 +1,100 @@
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+
+# fractional bits of the scale of an exact letterbox
+DYADIC_BITS = 4
+
+
+class LetterboxGeometry:
+    """
+    Letterbox of a f_height x f_width frame into a height x width input.
+
+    The frame keeps its aspect and is centered in a zero padded canvas of
+    the input aspect, which is resized to the input. The frame lands on
+    the (x1, y1, x2, y2) roi of the input.
+
+    When the frame edges map to whole input pixels and the canvas is
+    downscaled by a dyadic scale (exact is True), the resize of the frame into the roi is
+    bit identical to the resize of the canvas: no output pixel blends the
+    frame with the padding. Otherwise the canvas has to be resized.
+
+    Parameters
+    ----------
+    f_height: int
+    f_width: int
+    height: int
+        model input height
+    width: int
+        model input width
+    """
+
+    def __init__(self, f_height, f_width, height, width):
+        self.f_height = f_height
+        self.f_width = f_width
+        self.height = height
+        self.width = width
+        self.scale = np.max((f_height / height, f_width / width))
+
+        # the frame in the padded canvas
+        self.canvas_height = int(round(self.scale * height))
+        self.canvas_width = int(round(self.scale * width))
+        self.start_y = (self.canvas_height - f_height) // 2
+        self.start_x = (self.canvas_width - f_width) // 2
+
+        # the frame edges in the input, in whole pixels if exact
+        edges_x = (self.start_x * width, (self.start_x + f_width) * width)
+        edges_y = (self.start_y * height, (self.start_y + f_height) * height)
+        self.roi = (
+            edges_x[0] // self.canvas_width, edges_y[0] // self.canvas_height,
+            edges_x[1] // self.canvas_width, edges_y[1] // self.canvas_height,
+        )
+        self.exact = (
+            is_dyadic_downscale(self.canvas_width, width) and
+            is_dyadic_downscale(self.canvas_height, height) and
+            all(edge % self.canvas_width == 0 for edge in edges_x) and
+            all(edge % self.canvas_height == 0 for edge in edges_y)
+        )
+
+
+def is_dyadic_downscale(src, dst):
+    # src / dst >= 1 with at most DYADIC_BITS fractional bits, so the sample
+    # positions of cv2.resize are exact floats, the same in the canvas and
+    # in the roi
+    return src >= dst and (src << DYADIC_BITS) % dst == 0
+
+
+@lru_cache(maxsize=16)
+def get_letterbox_geometry(f_height, f_width, height, width):
+    return LetterboxGeometry(f_height, f_width, height, width)
+
+
+def letterbox_canvas(frame, geometry):
+    """
+    Letterbox frame by the resize of the zero padded canvas
+    """
+    img = np.zeros(
+        (geometry.canvas_height, geometry.canvas_width) + frame.shape[2:],
+        np.uint8
+    )
+    img[
+        geometry.start_y: geometry.start_y + geometry.f_height,
+        geometry.start_x: geometry.start_x + geometry.f_width
+    ] = frame
+    return cv2.resize(img, (geometry.width, geometry.height))
+
+
+def letterbox_into(frame, geometry, out):
+    """
+    Letterbox frame into out, a zeroed (height, width[, C]) uint8 array,
+    without the padded canvas: the frame is resized directly into the roi
+    of out. Only bit identical to letterbox_canvas() if geometry.exact.
+    """
+    x1, y1, x2, y2 = geometry.roi
+    cv2.resize(frame, (x2 - x1, y2 - y1), dst=out[y1:y2, x1:x2])
+    return out
@@ -0,0 +1,84 @@
+import cv2
+import numpy as np
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+
+# width of the downscaled grayscale frame compared by MotionGate
+MOTION_WIDTH = 64
+# gray level difference counted as a changed pixel
+PIXEL_THRESHOLD = 16
+# process a frame after this many skipped frames even without motion
+MAX_SKIP = 30
+
+
+class MotionGate:
+    """
+    Skip the inference of frames without motion.
+
+    A frame is compared with the last processed frame, both downscaled to
+    MOTION_WIDTH pixels wide grayscale. It is processed if the fraction of
+    pixels changed by more than pixel_threshold is at least threshold, or
+    after max_skip skipped frames. Comparing with the last processed frame
+    (not the previous one) lets slow changes add up.
+
+    Parameters
+    ----------
+    threshold: float
+        Fraction (0 - 1) of changed pixels
+    max_skip: int
+    pixel_threshold: int
+    width: int
+    """
+
+    def __init__(self, threshold, max_skip=MAX_SKIP,
+                 pixel_threshold=PIXEL_THRESHOLD, width=MOTION_WIDTH):
+        self.threshold = threshold
+        self.max_skip = max_skip
+        self.pixel_threshold = pixel_threshold
+        self.width = width
+        self.reference = None
+        self.skipped = 0
+        self.total = 0
+        self.total_skipped = 0
+
+    def _downscale(self, frame):
+        h, w = frame.shape[0], frame.shape[1]
+        height = max(1, h * self.width // w)
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3 and small.shape[2] == 4:
+            return cv2.cvtColor(small, cv2.COLOR_BGRA2GRAY)
+        if small.ndim == 3:
+            return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small
+
+    def check(self, frame):
+        """
+        Returns
+        -------
+        process: bool
+            False if the frame can be skipped
+        """
+        self.total = self.total + 1
+        gray = self._downscale(frame)
+        process = self.reference is None or \
+            self.reference.shape != gray.shape or \
+            self.max_skip <= self.skipped
+        if not process:
+            changed = cv2.absdiff(gray, self.reference) > self.pixel_threshold
+            process = self.threshold <= np.count_nonzero(changed) / changed.size
+        if process:
+            self.reference = gray
+            self.skipped = 0
+            return True
+        self.skipped = self.skipped + 1
+        self.total_skipped = self.total_skipped + 1
+        return False
+
+    def log_stats(self, name='motion gate'):
+        ratio = self.total_skipped / self.total if self.total else 0
+        logger.info(
+            f'{name}: skipped {self.total_skipped} of {self.total} frames '
+            f'({ratio * 100:.1f}%)'
+        )
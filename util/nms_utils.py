@@ -21,73 +21,108 @@ def bb_intersection_over_union(boxA, boxB):
     return iou
 
 
+def bb_intersection_over_union_matrix(boxes_a, boxes_b):
+    """
+    bb_intersection_over_union() of every pair of boxes_a and boxes_b, with
+    the same +1 pixel convention and arithmetic
+
+    Parameters
+    ----------
+    boxes_a: numpy array
+        (N, 4) boxes of x1, y1, x2, y2
+    boxes_b: numpy array
+        (M, 4) boxes of x1, y1, x2, y2
+
+    Returns
+    -------
+    iou: numpy array
+        (N, M) IoU
+    """
+    xA = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    yA = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    xB = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    yB = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    interArea = np.maximum(0, xB - xA + 1) * np.maximum(0, yB - yA + 1)
+    boxAArea = (boxes_a[:, 2] - boxes_a[:, 0] + 1) * (boxes_a[:, 3] - boxes_a[:, 1] + 1)
+    boxBArea = (boxes_b[:, 2] - boxes_b[:, 0] + 1) * (boxes_b[:, 3] - boxes_b[:, 1] + 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return interArea / (boxAArea[:, None] + boxBArea[None, :] - interArea)
+
+
 def nms_between_categories(detections, w, h, categories=None, iou_threshold=0.25):
     # Normally darknet use per class nms
     # But some cases need between class nms
     # https://github.com/opencv/opencv/issues/17111
 
     # remove overwrapped detection
-    det = []
-    keep = []
-    for idx in range(len(detections)):
-        obj = detections[idx]
-        is_keep = True
-        for idx2 in range(len(det)):
-            if not keep[idx2]:
-                continue
-            box_a = [w * det[idx2].x, h * det[idx2].y, w * (det[idx2].x + det[idx2].w), h * (det[idx2].y + det[idx2].h)]
-            box_b = [w * obj.x, h * obj.y, w * (obj.x + obj.w), h * (obj.y + obj.h)]
-            iou = bb_intersection_over_union(box_a, box_b)
-            if iou >= iou_threshold and (
-                    categories == None or ((det[idx2].category in categories) and (obj.category in categories))):
-                if det[idx2].prob <= obj.prob:
-                    keep[idx2] = False
-                else:
-                    is_keep = False
-        det.append(obj)
-        keep.append(is_keep)
-
-    det = []
-    for idx in range(len(detections)):
-        if keep[idx]:
-            det.append(detections[idx])
-
-    return det
+    n = len(detections)
+    if n == 0:
+        return []
+    x = np.array([obj.x for obj in detections], dtype=np.float64)
+    y = np.array([obj.y for obj in detections], dtype=np.float64)
+    ow = np.array([obj.w for obj in detections], dtype=np.float64)
+    oh = np.array([obj.h for obj in detections], dtype=np.float64)
+    prob = np.array([obj.prob for obj in detections])
+    boxes = np.stack([w * x, h * y, w * (x + ow), h * (y + oh)], axis=1)
+    overlap = bb_intersection_over_union_matrix(boxes, boxes) >= iou_threshold
+    if categories is not None:
+        in_categories = np.array([obj.category in categories for obj in detections])
+        overlap &= in_categories[:, None] & in_categories[None, :]
+
+    # same sequence as comparing each detection with the previous kept ones
+    keep = np.zeros(n, dtype=bool)
+    for i in range(n):
+        cand = np.flatnonzero(keep[:i] & overlap[i, :i])
+        weaker = prob[cand] <= prob[i]
+        keep[cand[weaker]] = False
+        keep[i] = weaker.all()
+
+    return [detections[idx] for idx in np.flatnonzero(keep)]
 
 
 def nms_boxes(boxes, scores, iou_thres):
     # Performs non-maximum suppression (NMS) on the boxes according to their intersection-over-union (IoU).
-
-    keep = []
-    for i, box_a in enumerate(boxes):
-        is_keep = True
-        for j in range(i):
-            if not keep[j]:
-                continue
-            box_b = boxes[j]
-            iou = bb_intersection_over_union(box_a, box_b)
-            if iou >= iou_thres:
-                if scores[i] > scores[j]:
-                    keep[j] = False
-                else:
-                    is_keep = False
-                    break
-
-        keep.append(is_keep)
-
-    return np.array(keep).nonzero()[0]
+    boxes = np.asarray(boxes)
+    scores = np.asarray(scores)
+    n = len(boxes)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    overlap = bb_intersection_over_union_matrix(boxes, boxes) >= iou_thres
+    return _nms_sequential(overlap, scores)
+
+
+def _nms_sequential(overlap, scores):
+    # same sequence as comparing each box with the previous kept ones in
+    # index order, stopping at the first one scoring at least as high
+    n = len(scores)
+    keep = np.zeros(n, dtype=bool)
+    for i in range(n):
+        cand = np.flatnonzero(keep[:i] & overlap[i, :i])
+        stronger = ~(scores[i] > scores[cand])
+        if stronger.any():
+            first = np.argmax(stronger)
+            keep[cand[:first]] = False
+        else:
+            keep[cand] = False
+            keep[i] = True
+
+    return keep.nonzero()[0]
 
 
 def batched_nms(boxes, scores, labels, iou_thres):
-    a = []
-    for i in np.unique(labels):
-        idx = (labels == i)
-        idx = np.nonzero(idx)[0]
-        i = nms_boxes(boxes[idx], scores[idx], iou_thres)
-        idx = idx[i]
-        a.append(idx)
-
-    keep = np.concatenate(a)
+    # boxes of different labels never suppress each other (category offset
+    # trick as a mask on the IoU matrix, which keeps the IoU values exact)
+    boxes = np.asarray(boxes)
+    scores = np.asarray(scores)
+    labels = np.asarray(labels)
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    overlap = bb_intersection_over_union_matrix(boxes, boxes) >= iou_thres
+    overlap &= labels[:, None] == labels[None, :]
+    keep = _nms_sequential(overlap, scores)
+
+    # grouped by label as the per label nms, then sorted by score
+    keep = keep[np.argsort(labels[keep], kind='stable')]
     scores = scores[keep]
     idxs = np.argsort(-scores)
     keep = keep[idxs]
@@ -96,20 +131,15 @@ def batched_nms(boxes, scores, labels, iou_thres):
 
 
 def packed_nms(boxes, scores, iou_thres):
+    boxes = np.asarray(boxes)
     packed_idx = []
-    remained = np.argsort(-scores)
+    remained = np.argsort(-np.asarray(scores))
     while 0 < len(remained):
-        idx = remained
-        i = idx[0]
-        candidates = [i]
-        remained = []
-        for j in idx[1:]:
-            similarity = bb_intersection_over_union(boxes[i], boxes[j])
-            if similarity > iou_thres:
-                candidates.append(j)
-            else:
-                remained.append(j)
-
-        packed_idx.append(candidates)
+        i = remained[0]
+        rest = remained[1:]
+        similarity = bb_intersection_over_union_matrix(boxes[i:i + 1], boxes[rest])[0]
+        similar = similarity > iou_thres
+        packed_idx.append([i] + list(rest[similar]))
+        remained = rest[~similar]
 
     return packed_idx
@@ -0,0 +1,101 @@
+import queue
+import threading
+import time
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+
+class PipelineStage:
+    """
+    Worker thread applying func to every item of a pipeline.
+
+    The stage pulls items from source (a callable returning the next item,
+    or None at the end of stream), and hands func(item) to the next stage
+    through a bounded queue read by get(). Items are processed one at a
+    time in arrival order, so a chain of stages emits results in the order
+    of the source.
+
+    Parameters
+    ----------
+    name: str
+        Stage name for the logs
+    func: callable
+        Processing of one item
+    source: callable
+        Returns the next input item, or None at the end of stream
+    depth: int
+        Queue depth of the hand-off to the next stage
+    """
+
+    def __init__(self, name, func, source, depth=2):
+        self.name = name
+        self.func = func
+        self.source = source
+        self.queue = queue.Queue(maxsize=max(1, depth))
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.count = 0
+        self.busy_time = 0
+        self.start_time = None
+        self.end_time = None
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def _put(self, item):
+        while not self.stop_event.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _run(self):
+        try:
+            while not self.stop_event.is_set():
+                item = self.source()
+                if item is None:
+                    break
+                start = time.perf_counter()
+                result = self.func(item)
+                self.busy_time = self.busy_time + time.perf_counter() - start
+                self.count = self.count + 1
+                self._put(result)
+        except Exception:
+            logger.exception(f'pipeline stage {self.name} failed')
+        finally:
+            self.end_time = time.perf_counter()
+            self._put(None)
+
+    def get(self):
+        """
+        Next processed item, or None at the end of stream or after stop()
+        """
+        while not self.stop_event.is_set():
+            try:
+                return self.queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return None
+
+    def utilisation(self):
+        end = self.end_time if self.end_time is not None else time.perf_counter()
+        elapsed = end - self.start_time
+        return self.busy_time / elapsed if elapsed > 0 else 0
+
+    def log_stats(self):
+        average = self.busy_time * 1000 / self.count if self.count else 0
+        logger.info(
+            f'stage {self.name}: {self.count} items, '
+            f'average {average:.1f} ms, utilisation {self.utilisation() * 100:.1f}%'
+        )
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
@@ -0,0 +1,75 @@
+import json
+import os
+import time
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+
+# seconds between the mtime checks of SettingsWatcher
+SETTINGS_POLL_INTERVAL = 1.0
+
+
+class SettingsWatcher:
+    """
+    Reload a settings json file when it is modified.
+
+    poll() is cheap enough to be called every frame: the file is stat()-ed
+    at most once per interval, and read only when its mtime changed.
+
+    Parameters
+    ----------
+    path: str
+    interval: float
+        Seconds between mtime checks
+    """
+
+    def __init__(self, path, interval=SETTINGS_POLL_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.mtime = None
+        self.last_check = None
+
+    def poll(self):
+        """
+        Returns
+        -------
+        settings: dict
+            The settings if the file is new or modified, else None
+        """
+        now = time.time()
+        if self.last_check is not None and now - self.last_check < self.interval:
+            return None
+        self.last_check = now
+
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return None
+        if mtime == self.mtime:
+            return None
+        try:
+            with open(self.path) as f:
+                settings = json.load(f)
+        except ValueError:
+            # being written, retry at the next check
+            return None
+        self.mtime = mtime
+        return settings
+
+
+def parse_bool(value):
+    """
+    bool of a settings or command value: a json bool, or the string "true"
+    or "false" in any case. bool() would take "false" as True.
+
+    Raises
+    ------
+    ValueError
+        Any other value
+    """
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.lower() in ('true', 'false'):
+        return value.lower() == 'true'
+    raise ValueError(f'not a bool: {value!r}')
@@ -0,0 +1,31 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ailia = pytest.importorskip('ailia')
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from detector_utils import reverse_letterbox, reverse_letterbox_boxes  # noqa: E402
+
+
+@pytest.mark.parametrize('img_shape', [(1080, 1920, 3), (1000, 999, 3), (480, 640, 3)])
+@pytest.mark.parametrize('det_shape', [(640, 640), (416, 416), (384, 640), None])
+def test_reverse_letterbox_boxes(img_shape, det_shape):
+    rng = np.random.default_rng(0)
+    img = np.zeros(img_shape, np.uint8)
+    xywh = rng.random((8, 4)) * 0.5
+    detections = [
+        ailia.DetectorObject(category=0, prob=1.0, x=x, y=y, w=w, h=h)
+        for x, y, w, h in xywh
+    ]
+
+    expected = [
+        (d.x, d.y, d.x + d.w, d.y + d.h)
+        for d in reverse_letterbox(detections, img, det_shape)
+    ]
+    boxes = np.concatenate([xywh[:, :2], xywh[:, :2] + xywh[:, 2:]], axis=1)
+    np.testing.assert_allclose(
+        reverse_letterbox_boxes(boxes, img, det_shape), expected, atol=1e-6
+    )
@@ -0,0 +1,48 @@
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from letterbox_utils import get_letterbox_geometry, letterbox_canvas, letterbox_into  # noqa: E402
+
+FRAME_SHAPES = [
+    (1080, 1920), (720, 1280), (480, 640), (2160, 3840), (1000, 999),
+    (500, 500), (300, 200), (1080, 1440), (1920, 1080), (600, 800),
+]
+INPUT_SHAPES = [(640, 640), (416, 416), (480, 640), (384, 640), (608, 608)]
+
+
+def letterbox_baseline(frame, height, width):
+    # the letterbox_convert() of detector_utils before the roi resize
+    f_height, f_width = frame.shape[0], frame.shape[1]
+    scale = np.max((f_height / height, f_width / width))
+    img = np.zeros(
+        (int(round(scale * height)), int(round(scale * width)), 3), np.uint8
+    )
+    start = (np.array(img.shape) - np.array(frame.shape)) // 2
+    img[start[0]: start[0] + f_height, start[1]: start[1] + f_width] = frame
+    return cv2.resize(img, (width, height))
+
+
+@pytest.mark.parametrize('f_height, f_width', FRAME_SHAPES)
+@pytest.mark.parametrize('height, width', INPUT_SHAPES)
+def test_letterbox_is_bit_identical(f_height, f_width, height, width):
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (f_height, f_width, 3), dtype=np.uint8)
+    expected = letterbox_baseline(frame, height, width)
+
+    geometry = get_letterbox_geometry(f_height, f_width, height, width)
+    np.testing.assert_array_equal(letterbox_canvas(frame, geometry), expected)
+    if geometry.exact:
+        out = np.zeros((height, width, 3), np.uint8)
+        np.testing.assert_array_equal(letterbox_into(frame, geometry, out), expected)
+
+
+def test_hd_frames_are_exact():
+    # the common camera resolutions take the roi resize
+    assert get_letterbox_geometry(1080, 1920, 640, 640).exact
+    assert get_letterbox_geometry(720, 1280, 384, 640).exact
+    assert not get_letterbox_geometry(1000, 999, 640, 640).exact
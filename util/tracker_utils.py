@@ -0,0 +1,230 @@
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+
+# same fields as ailia.DetectorObject (normalized x, y, w, h) and the track id
+TrackedObject = namedtuple(
+    'TrackedObject', ['category', 'prob', 'x', 'y', 'w', 'h', 'track_id']
+)
+
+IOU_THRESHOLD = 0.3
+# a track is removed after this many detections without match
+MAX_MISSES = 2
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """
+    IoU of every pair of boxes
+
+    Parameters
+    ----------
+    boxes_a: numpy array
+        (N, 4) boxes of x1, y1, x2, y2
+    boxes_b: numpy array
+        (M, 4) boxes of x1, y1, x2, y2
+
+    Returns
+    -------
+    iou: numpy array
+        (N, M) IoU
+    """
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    wh = np.clip(bottom_right - top_left, 0, None)
+    inter = wh[:, :, 0] * wh[:, :, 1]
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return inter / np.maximum(union, np.finfo(np.float64).eps)
+
+
+def greedy_match(iou, threshold):
+    """
+    Match rows and columns by descending IoU
+
+    Returns
+    -------
+    pairs: list of (row, column) tuple
+        pairs with IoU >= threshold, each row and column used at most once
+    """
+    pairs = []
+    if iou.size == 0:
+        return pairs
+    order = np.argsort(-iou, axis=None, kind='stable')
+    rows, cols = np.unravel_index(order, iou.shape)
+    used_rows = np.zeros(iou.shape[0], dtype=bool)
+    used_cols = np.zeros(iou.shape[1], dtype=bool)
+    for row, col in zip(rows, cols):
+        if iou[row, col] < threshold:
+            break
+        if used_rows[row] or used_cols[col]:
+            continue
+        used_rows[row] = True
+        used_cols[col] = True
+        pairs.append((int(row), int(col)))
+    return pairs
+
+
+def to_corners(objects):
+    boxes = np.zeros((len(objects), 4))
+    for i, obj in enumerate(objects):
+        boxes[i] = (obj.x, obj.y, obj.x + obj.w, obj.y + obj.h)
+    return boxes
+
+
+class IouTracker:
+    """
+    Multi object tracker matching the detections to the tracks by IoU.
+
+    update() is called with the detections of a frame, predict() on the
+    frames without detection and moves the tracks by their velocity
+    (constant velocity between two detections). Both return the tracked
+    objects with their track id. get_state() may be called from another
+    thread.
+
+    Parameters
+    ----------
+    iou_threshold: float
+        Minimum IoU of a match
+    max_misses: int
+        Number of detections without match before a track is removed
+    """
+
+    def __init__(self, iou_threshold=IOU_THRESHOLD, max_misses=MAX_MISSES):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.next_id = 0
+        # per track (x1, y1, x2, y2), velocity per frame, category, prob, id, misses
+        self.boxes = np.zeros((0, 4))
+        self.velocities = np.zeros((0, 4))
+        self.categories = np.zeros(0, dtype=np.int64)
+        self.probs = np.zeros(0)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.misses = np.zeros(0, dtype=np.int64)
+        self.frames_since_update = 0
+        self.lock = threading.Lock()
+
+    def needs_detection(self, interval):
+        """
+        Whether the current frame is a detection frame of every interval
+        frames
+        """
+        return self.frames_since_update + 1 >= interval or len(self.ids) == 0
+
+    def _objects(self, visible):
+        objects = []
+        for i in np.flatnonzero(visible):
+            x1, y1, x2, y2 = self.boxes[i]
+            objects.append(TrackedObject(
+                int(self.categories[i]), float(self.probs[i]),
+                float(x1), float(y1), float(x2 - x1), float(y2 - y1),
+                int(self.ids[i])
+            ))
+        return objects
+
+    def update(self, objects):
+        """
+        Parameters
+        ----------
+        objects: list of ailia.DetectorObject
+            detections of the current frame
+
+        Returns
+        -------
+        objects: list of TrackedObject
+            the detections in the same order, with their track id
+        """
+        with self.lock:
+            return self._update(objects)
+
+    def _update(self, objects):
+        frames = self.frames_since_update + 1
+        self.frames_since_update = 0
+        boxes = to_corners(objects)
+        pairs = greedy_match(
+            iou_matrix(self.boxes + self.velocities, boxes), self.iou_threshold
+        )
+
+        matched = np.zeros(len(self.ids), dtype=bool)
+        track_index = np.full(len(objects), -1, dtype=np.int64)
+        for track, det in pairs:
+            matched[track] = True
+            track_index[det] = track
+            # predicted since the last detection by frames - 1 steps
+            previous = self.boxes[track] - self.velocities[track] * (frames - 1)
+            self.velocities[track] = (boxes[det] - previous) / frames
+            self.boxes[track] = boxes[det]
+            self.probs[track] = objects[det].prob
+        self.misses[matched] = 0
+        self.misses[~matched] += 1
+
+        new = np.flatnonzero(track_index < 0)
+        track_index[new] = len(self.ids) + np.arange(len(new))
+        self.boxes = np.concatenate([self.boxes, boxes[new]])
+        self.velocities = np.concatenate([self.velocities, np.zeros((len(new), 4))])
+        self.categories = np.concatenate([
+            self.categories, [objects[i].category for i in new]
+        ]).astype(np.int64)
+        self.probs = np.concatenate([self.probs, [objects[i].prob for i in new]])
+        self.ids = np.concatenate([
+            self.ids, self.next_id + np.arange(len(new))
+        ]).astype(np.int64)
+        self.misses = np.concatenate([self.misses, np.zeros(len(new), dtype=np.int64)])
+        self.next_id = self.next_id + len(new)
+
+        result = [
+            TrackedObject(
+                obj.category, obj.prob, obj.x, obj.y, obj.w, obj.h,
+                int(self.ids[track_index[i]])
+            )
+            for i, obj in enumerate(objects)
+        ]
+
+        # remove the lost tracks
+        keep = self.misses <= self.max_misses
+        for name in ['boxes', 'velocities', 'categories', 'probs', 'ids', 'misses']:
+            setattr(self, name, getattr(self, name)[keep])
+        return result
+
+    def predict(self):
+        """
+        Returns
+        -------
+        objects: list of TrackedObject
+            the tracks matched by the last update(), moved by one frame
+        """
+        with self.lock:
+            self.frames_since_update = self.frames_since_update + 1
+            self.boxes = self.boxes + self.velocities
+            return self._objects(self.misses == 0)
+
+    def get_state(self):
+        """
+        State for a checkpoint, restored by set_state()
+        """
+        with self.lock:
+            return {
+                'next_id': self.next_id,
+                'boxes': self.boxes.tolist(),
+                'velocities': self.velocities.tolist(),
+                'categories': self.categories.tolist(),
+                'probs': self.probs.tolist(),
+                'ids': self.ids.tolist(),
+                'misses': self.misses.tolist(),
+                'frames_since_update': self.frames_since_update,
+            }
+
+    def set_state(self, state):
+        self.next_id = state['next_id']
+        self.boxes = np.array(state['boxes']).reshape(-1, 4)
+        self.velocities = np.array(state['velocities']).reshape(-1, 4)
+        self.categories = np.array(state['categories'], dtype=np.int64)
+        self.probs = np.array(state['probs'], dtype=np.float64)
+        self.ids = np.array(state['ids'], dtype=np.int64)
+        self.misses = np.array(state['misses'], dtype=np.int64)
+        self.frames_since_update = state['frames_since_update']
@@ -0,0 +1,487 @@
+import csv
+import os
+import queue
+import threading
+import time
+
+import cv2
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+
+def is_camera_input(video):
+    """
+    Whether the --video argument is a webcamera-id (True) or a file path
+    """
+    try:
+        int(video)
+        return True
+    except ValueError:
+        return False
+
+
+# skip by CAP_PROP_POS_FRAMES instead of grab() from this many frames
+SEEK_THRESHOLD = 60
+
+
+class FrameReader:
+    """
+    Frame source of cv2.VideoCapture with frame sampling and optional
+    decode prefetch.
+
+    Only sampled frames are decoded. Skipped frames are grab()-ed without
+    retrieve(), and long skips in video files seek by CAP_PROP_POS_FRAMES.
+
+    With depth > 0, frames are decoded in a background thread and handed
+    over through a bounded queue, so that the decode latency overlaps the
+    inference of the previous frame. With depth == 0, read() decodes in the
+    caller's thread.
+
+    Parameters
+    ----------
+    capture: cv2.VideoCapture
+    depth: int
+        Queue depth of prefetched frames. 0 disables the decode thread.
+    latest_only: bool
+        Keep only the newest sampled frame and drop older ones, so that
+        stale frames never queue up behind a slow consumer (live cameras).
+    live: bool
+        Use the wall-clock time as timestamp instead of the media time.
+    frame_interval: int
+        Sample every frame_interval-th frame.
+    sample_interval: float
+        If > 0, sample by time instead of frame_interval: one frame every
+        sample_interval seconds of media time (or wall-clock time if live).
+    seek_threshold: int
+        Minimum skip length to seek instead of grab() in video files.
+    start_frame: int
+        First frame index to read (video files only).
+    end_frame: int
+        Stop before this frame index, or None to read to the end.
+    pool: BufferPool
+        Decode into frames borrowed from pool, or None to allocate every
+        frame. The consumer releases the frames to pool when done.
+    """
+
+    def __init__(self, capture, depth=0, latest_only=False, live=False,
+                 frame_interval=1, sample_interval=0,
+                 seek_threshold=SEEK_THRESHOLD, start_frame=0, end_frame=None,
+                 pool=None):
+        self.capture = capture
+        self.depth = depth
+        self.latest_only = latest_only
+        self.live = live
+        self.frame_interval = max(1, frame_interval)
+        self.sample_interval = sample_interval
+        self.seek_threshold = seek_threshold
+        self.end_frame = end_frame
+        self.index = -1
+        self.next_index = 0
+        if 0 < start_frame:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+            self.index = start_frame - 1
+            self.next_index = start_frame
+        self.next_time = None
+        self.pool = pool
+        self.frame_shape = None
+        self.decoded = 0
+        self.dropped = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.queue = None
+        if depth > 0:
+            self.queue = queue.Queue(maxsize=1 if latest_only else depth)
+
+    def start(self):
+        if self.queue is not None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+        return self
+
+    def _timestamp(self):
+        if self.live:
+            return time.time()
+        return self.capture.get(cv2.CAP_PROP_POS_MSEC) / 1000
+
+    def _grab(self):
+        if self.end_frame is not None and self.end_frame <= self.index + 1:
+            return False
+        if not self.capture.grab():
+            return False
+        self.index = self.index + 1
+        return True
+
+    def _grab_by_time(self):
+        while self._grab():
+            timestamp = self._timestamp()
+            if self.next_time is None or self.next_time <= timestamp:
+                if self.next_time is None or \
+                   self.next_time + self.sample_interval <= timestamp:
+                    # first frame, or fell behind the schedule
+                    self.next_time = timestamp + self.sample_interval
+                else:
+                    self.next_time = self.next_time + self.sample_interval
+                return True
+        return False
+
+    def _grab_by_interval(self):
+        skip = self.next_index - (self.index + 1)
+        if self.end_frame is not None and self.end_frame <= self.next_index:
+            return False
+        if not self.live and skip >= self.seek_threshold:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, self.next_index)
+            self.index = self.next_index - 1
+        while self.index + 1 < self.next_index:
+            if not self._grab():
+                return False
+        if not self._grab():
+            return False
+        self.next_index = self.index + self.frame_interval
+        return True
+
+    def _decode(self):
+        if self.sample_interval > 0:
+            ret = self._grab_by_time()
+        else:
+            ret = self._grab_by_interval()
+        if not ret:
+            return None
+        buffer = None
+        if self.pool is not None and self.frame_shape is not None:
+            buffer = self.pool.acquire(self.frame_shape)
+        ret, frame = self.capture.retrieve(buffer)
+        if buffer is not None and frame is not buffer:
+            # the resolution changed
+            self.pool.release(buffer)
+        if not ret:
+            return None
+        self.frame_shape = frame.shape
+        self.decoded = self.decoded + 1
+        return (self.index, self._timestamp(), frame)
+
+    def _put(self, item):
+        if self.latest_only:
+            try:
+                stale = self.queue.get_nowait()
+                self.dropped = self.dropped + 1
+                if self.pool is not None and stale is not None:
+                    self.pool.release(stale[2])
+            except queue.Empty:
+                pass
+            self.queue.put_nowait(item)
+            return
+        while not self.stop_event.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            item = self._decode()
+            self._put(item)
+            if item is None:
+                break
+
+    def read(self):
+        """
+        Returns
+        -------
+        ret: bool
+            False at the end of stream or after stop()
+        index: int
+            frame index in the stream
+        timestamp: float
+            media time (or wall-clock time if live) in seconds
+        frame: numpy array
+        """
+        if self.queue is None:
+            item = None if self.stop_event.is_set() else self._decode()
+        else:
+            item = None
+            while not self.stop_event.is_set():
+                try:
+                    item = self.queue.get(timeout=0.1)
+                    break
+                except queue.Empty:
+                    pass
+        if item is None:
+            return False, self.index + 1, None, None
+        return (True,) + item
+
+    def poll(self):
+        """
+        Non-blocking read(). Returns None if no frame is decoded yet.
+        """
+        if self.queue is None:
+            return self.read()
+        try:
+            item = self.queue.get_nowait()
+        except queue.Empty:
+            return None
+        if item is None:
+            return False, self.index + 1, None, None
+        return (True,) + item
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        logger.info(
+            f'frame reader: read {self.index + 1} frames, '
+            f'decoded {self.decoded}, dropped {self.dropped} stale frames'
+        )
+
+
+def split_frame_range(frame_count, shards, align=1):
+    """
+    Split frames [0, frame_count) into at most shards contiguous ranges
+
+    Parameters
+    ----------
+    frame_count: int
+    shards: int
+    align: int
+        Range starts are multiples of align, so that sampling every
+        align-th frame per range samples the same frames as a single pass.
+
+    Returns
+    -------
+    ranges: list of (start, end) tuple
+    """
+    size = -(-frame_count // max(1, shards))
+    size = max(1, -(-size // align) * align)
+    return [
+        (start, min(start + size, frame_count))
+        for start in range(0, frame_count, size)
+    ]
+
+
+def concat_videos(paths, writer):
+    """
+    Append the frames of the video files of paths to writer, in order
+    """
+    count = 0
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        capture = cv2.VideoCapture(path)
+        while True:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            writer.write(frame)
+            count = count + 1
+        capture.release()
+    return count
+
+
+def concat_csv(paths, csv_path):
+    """
+    Concatenate the csv files of paths into csv_path, keeping the header
+    row of the first file only
+    """
+    with open(csv_path, 'w', newline='') as out_file:
+        header_written = False
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, newline='') as in_file:
+                rows = csv.reader(in_file)
+                header = next(rows, None)
+                if header is not None and not header_written:
+                    csv.writer(out_file).writerow(header)
+                    header_written = True
+                csv.writer(out_file).writerows(rows)
+
+
+# interval (seconds) of the queue depth log of OutputWriter
+OUTPUT_LOG_INTERVAL = 10
+
+
+class OutputWriter:
+    """
+    Output stage for video frames, image snapshots and csv rows.
+
+    With depth > 0, encoding and file writes run in a background thread fed
+    by a bounded queue, so that they do not block the next inference.
+    With depth == 0, everything is written in the caller's thread.
+
+    Parameters
+    ----------
+    writer: cv2.VideoWriter
+        Video writer, or None
+    csv_path: str
+        Path of the csv file, or None
+    csv_header: list of str
+        Header row of the csv file
+    depth: int
+        Queue depth. 0 disables the output thread.
+    drop: bool
+        Backpressure policy when the queue is full. False blocks the
+        caller, True drops the video frame or snapshot. Csv rows are never
+        dropped.
+    csv_offset: int
+        Resume an existing csv file at this byte offset (from csv_tell()),
+        truncating the rows written after it, instead of creating it.
+    pool: BufferPool
+        Pool of the frames given to release()
+    """
+
+    def __init__(self, writer=None, csv_path=None, csv_header=None,
+                 depth=0, drop=False, csv_offset=None, pool=None):
+        self.writer = writer
+        self.pool = pool
+        self.csv_file = None
+        self.csv_writer = None
+        if csv_path and csv_offset is not None:
+            self.csv_file = open(csv_path, 'r+', newline='')
+            self.csv_file.truncate(csv_offset)
+            self.csv_file.seek(csv_offset)
+            self.csv_writer = csv.writer(self.csv_file)
+        elif csv_path:
+            self.csv_file = open(csv_path, 'w', newline='')
+            self.csv_writer = csv.writer(self.csv_file)
+            if csv_header:
+                self.csv_writer.writerow(csv_header)
+        self.drop = drop
+        self.written = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.last_log = time.time()
+        self.thread = None
+        self.queue = None
+        if depth > 0:
+            self.queue = queue.Queue(maxsize=depth)
+
+    def start(self):
+        if self.queue is not None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+        return self
+
+    def _process(self, item):
+        kind, data = item
+        if kind == 'video':
+            self.writer.write(data)
+        elif kind == 'image':
+            path, img = data
+            cv2.imwrite(path, img)
+        elif kind == 'rows':
+            self.csv_writer.writerows(data)
+        elif kind == 'release':
+            self.pool.release(data)
+            return
+        self.written = self.written + 1
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+            self._process(item)
+            self.queue.task_done()
+
+    def _put(self, item, droppable=True):
+        if self.queue is None:
+            self._process(item)
+            return
+        if self.drop and droppable:
+            try:
+                self.queue.put_nowait(item)
+            except queue.Full:
+                self.dropped = self.dropped + 1
+        else:
+            self.queue.put(item)
+
+        depth = self.queue.qsize()
+        self.max_depth = max(self.max_depth, depth)
+        now = time.time()
+        if OUTPUT_LOG_INTERVAL <= now - self.last_log:
+            self.last_log = now
+            logger.info(
+                f'output queue depth: {depth} (max {self.max_depth}), '
+                f'dropped {self.dropped}'
+            )
+
+    def write(self, frame):
+        """
+        Write a frame to the video. frame must not be modified afterwards.
+        """
+        if self.writer is not None:
+            self._put(('video', frame))
+
+    def write_image(self, path, img):
+        """
+        Save img to path. img must not be modified afterwards.
+        """
+        self._put(('image', (path, img)))
+
+    def write_rows(self, rows):
+        if self.csv_writer is not None and rows:
+            self._put(('rows', rows), droppable=False)
+
+    def release(self, frame):
+        """
+        Give frame back to the pool after the queued writes of it
+        """
+        if self.pool is None:
+            return
+        if self.queue is None:
+            self.pool.release(frame)
+            return
+        try:
+            self.queue.put_nowait(('release', frame))
+        except queue.Full:
+            # left to the garbage collector rather than blocking
+            pass
+
+    def flush(self):
+        """
+        Wait until every queued output is written, and sync the csv file
+        """
+        if self.queue is not None:
+            self.queue.join()
+        if self.csv_file is not None:
+            self.csv_file.flush()
+            os.fsync(self.csv_file.fileno())
+
+    def csv_tell(self):
+        """
+        Byte offset of the csv file after flush(), for csv_offset
+        """
+        self.flush()
+        if self.csv_file is None:
+            return None
+        return self.csv_file.tell()
+
+    def replace_writer(self, writer):
+        """
+        Finish the current video file and continue with writer
+        """
+        self.flush()
+        if self.writer is not None:
+            self.writer.release()
+        self.writer = writer
+
+    def close(self):
+        """
+        Flush every queued output and release the writers
+        """
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        if self.writer is not None:
+            self.writer.release()
+        if self.csv_file is not None:
+            self.csv_file.close()
+        if self.queue is not None:
+            logger.info(
+                f'output queue: written {self.written}, '
+                f'dropped {self.dropped}, max depth {self.max_depth}'
+            )
@@ -0,0 +1,130 @@
+import json
+
+import cv2
+import numpy as np
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+
+ZONE_INCLUDE = 'include'
+ZONE_IGNORE = 'ignore'
+
+# the detector runs on the bounding box of the include zones if it is at
+# most this fraction of the frame
+CROP_AREA_RATIO = 0.5
+
+ZONE_COLORS = {ZONE_INCLUDE: (255, 128, 0), ZONE_IGNORE: (128, 128, 128)}
+
+
+def load_zones(path):
+    """
+    Zones of a json file, either a settings json with a "zones" list or
+    the list itself
+    """
+    with open(path) as f:
+        zones = json.load(f)
+    if isinstance(zones, dict):
+        zones = zones.get('zones', [])
+    return zones
+
+
+class ZoneSet:
+    """
+    Polygon zones of a camera.
+
+    Each zone is a dict of "type" ("include" or "ignore", default
+    "include"), "points" (list of [x, y] normalized by the frame size) and
+    an optional "name". A position is active if it is in an include zone
+    (or there is no include zone) and not in an ignore zone.
+
+    The membership mask and the detection crop are computed once per
+    frame resolution, so that the membership test is an array lookup.
+
+    Parameters
+    ----------
+    zones: list of dict
+    """
+
+    def __init__(self, zones):
+        self.zones = zones
+        self.include = [z for z in zones if z.get('type', ZONE_INCLUDE) == ZONE_INCLUDE]
+        self.ignore = [z for z in zones if z.get('type', ZONE_INCLUDE) == ZONE_IGNORE]
+        # (h, w) -> (mask, crop)
+        self.cache = {}
+
+    def _polygon(self, zone, h, w):
+        points = np.array(zone['points'], dtype=np.float64).reshape(-1, 2)
+        return np.round(points * (w, h)).astype(np.int32)
+
+    def _build(self, h, w):
+        if self.include:
+            mask = np.zeros((h, w), dtype=np.uint8)
+            cv2.fillPoly(mask, [self._polygon(z, h, w) for z in self.include], 1)
+        else:
+            mask = np.ones((h, w), dtype=np.uint8)
+        if self.ignore:
+            cv2.fillPoly(mask, [self._polygon(z, h, w) for z in self.ignore], 0)
+
+        crop = None
+        if self.include:
+            points = np.concatenate([self._polygon(z, h, w) for z in self.include])
+            x1, y1 = np.clip(points.min(axis=0), 0, (w, h))
+            x2, y2 = np.clip(points.max(axis=0) + 1, 0, (w, h))
+            if (x2 - x1) * (y2 - y1) <= CROP_AREA_RATIO * h * w:
+                crop = (int(x1), int(y1), int(x2), int(y2))
+        return mask.astype(bool), crop
+
+    def get(self, h, w):
+        """
+        Returns
+        -------
+        mask: numpy array
+            (h, w) bool array, True at the active positions
+        crop: tuple
+            (x1, y1, x2, y2) detection crop in pixel, or None for the whole
+            frame
+        """
+        if (h, w) not in self.cache:
+            self.cache[(h, w)] = self._build(h, w)
+            logger.info(f'zone masks built for {w}x{h}')
+        return self.cache[(h, w)]
+
+    def contains(self, points, h, w):
+        """
+        Parameters
+        ----------
+        points: numpy array
+            (N, 2) positions normalized by the frame size
+
+        Returns
+        -------
+        active: numpy array
+            (N,) bool
+        """
+        mask, _ = self.get(h, w)
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        px = np.clip((points[:, 0] * w).astype(np.int64), 0, w - 1)
+        py = np.clip((points[:, 1] * h).astype(np.int64), 0, h - 1)
+        return mask[py, px]
+
+    def filter(self, objects, h, w):
+        """
+        Objects (with normalized x, y, w, h) whose box center is active
+        """
+        if len(objects) == 0:
+            return objects
+        centers = [(obj.x + obj.w / 2, obj.y + obj.h / 2) for obj in objects]
+        active = self.contains(centers, h, w)
+        return [obj for obj, keep in zip(objects, active) if keep]
+
+    def get_crop(self, h, w):
+        return self.get(h, w)[1]
+
+    def draw(self, img):
+        h, w = img.shape[0], img.shape[1]
+        for zone in self.zones:
+            color = ZONE_COLORS[zone.get('type', ZONE_INCLUDE)]
+            if img.ndim == 3 and img.shape[2] == 4:
+                color = color + (255,)
+            cv2.polylines(img, [self._polygon(zone, h, w)], True, color, 2)